@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from starlette import status
+
+from api.v1 import messages
+from models.cache import CacheInvalidation, CacheInvalidationResult, CacheStatsOut
+from services.cache import CacheAdminService, get_cache_admin_service
+
+
+router = APIRouter()
+
+
+@router.post('/invalidate',
+             response_model=CacheInvalidationResult,
+             description="Сброс всех закешированных ответов, содержащих указанные фильмы, жанры и персоны")
+async def invalidate_cache(
+        invalidation: CacheInvalidation,
+        x_cache_token: str | None = Header(default=None),
+        cache_service: CacheAdminService = Depends(get_cache_admin_service),
+) -> CacheInvalidationResult:
+    if not cache_service.check_token(x_cache_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=messages.CACHE_ADMIN_FORBIDDEN)
+    deleted = await cache_service.invalidate(invalidation)
+    return CacheInvalidationResult(deleted=deleted)
+
+
+@router.get('/stats',
+            response_model=CacheStatsOut,
+            description="Статистика кеша текущего воркера по пространствам имён и выборочная сводка по ключам Redis")
+async def cache_stats(
+        x_cache_token: str | None = Header(default=None),
+        cache_service: CacheAdminService = Depends(get_cache_admin_service),
+) -> CacheStatsOut:
+    if not cache_service.check_token(x_cache_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=messages.CACHE_ADMIN_FORBIDDEN)
+    return await cache_service.stats()
@@ -1,20 +1,24 @@
+from functools import partial
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from starlette import status
 from starlette.requests import Request
 
 from api.v1 import messages
+from api.v1.pagination import check_page_number, encode_cursor, get_cursor
+from core.config import settings
 from models.film import FilmOut, FilmGenreOut
-from models.utils import PaginatedResults
+from models.utils import Cursor, PaginatedResults
 from services.auth import CheckAuth, get_check_auth_service
+from services.prefetch import Prefetcher, get_prefetcher
+from services.response_cache import ResponseCache, collect_tags, get_response_cache
 from services.film import (
     FilmServiceID, get_film_service_id, 
     FilmServiceSearch, get_film_service_search,
     FilmServiceSort, get_film_service_sort
 )
-from limiter import rate_limit
 
 
 router = APIRouter()
@@ -23,27 +27,29 @@ router = APIRouter()
 @router.get('/{film_id}/',
             response_model=FilmOut,
             description="Получение фильма по id")
-@rate_limit()
 async def film_details(
         request: Request,
         film_id: str,
         film_service: FilmServiceID = Depends(get_film_service_id),
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
 ) -> FilmOut:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
+    cached = await response_cache.get(request, FilmOut)
+    if cached:
+        return cached
     film = await film_service.get_data(film_id)
     if not film:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=messages.FILM_NOT_FOUND)
 
-    return FilmOut.from_film(film)
+    return await response_cache.set(request, FilmOut.from_film(film), film.cache_tags())
 
 
 @router.get('/search',
             response_model=PaginatedResults[FilmGenreOut],
             description="Поиск фильма по title и description")
-@rate_limit()
 async def search_by_params(
         request: Request,
         search: str,
@@ -51,43 +57,72 @@ async def search_by_params(
                                           description=" Pagination page number")] = 1,
         page_size: Annotated[int, Query(ge=1,
                                         description="Pagination page size")] = 10,
+        cursor: Cursor | None = Depends(get_cursor),
         film_service: FilmServiceSearch = Depends(get_film_service_search),
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
 ) -> PaginatedResults[FilmGenreOut]:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
-    films = await film_service.get_data(search=search,
-                                        page_number=page_number,
-                                        page_size=page_size)
+    cached = await response_cache.get(request, PaginatedResults[FilmGenreOut])
+    if cached:
+        return cached
+    if cursor is None:
+        check_page_number(page_number, page_size)
+        films = await film_service.get_data(search=search,
+                                            page_number=page_number,
+                                            page_size=page_size)
+        next_cursor = Cursor.following(page_number, page_size, len(films))
+    else:
+        films, next_cursor = await film_service.get_page(search, page_size, cursor)
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=messages.FILM_NOT_FOUND)
 
     films_out = [FilmGenreOut.from_film(film) for film in films]
-    return PaginatedResults(results=films_out, page_size=page_size, page=page_number)
+    page = PaginatedResults[FilmGenreOut](results=films_out, page_size=page_size, page=page_number,
+                                          next_cursor=encode_cursor(request, next_cursor))
+    return await response_cache.set(request, page, collect_tags(films))
 
 
 @router.get('/',
             response_model=PaginatedResults[FilmGenreOut],
             description="Главная страница с фильмами. Сортировка по рейтингу. "
                         "Возможно указание жанра фильма по id жанра")
-@rate_limit()
 async def main_page(
         request: Request,
+        background_tasks: BackgroundTasks,
         page_number: Annotated[int, Query(ge=1,
                                           description="Pagination page number")] = 1,
         page_size: Annotated[int, Query(ge=1,
                                         description="Pagination page size")] = 10,
+        cursor: Cursor | None = Depends(get_cursor),
         genre: str = None,
         film_service: FilmServiceSort = Depends(get_film_service_sort),
         sort: str = '-imdb_rating',
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
+        prefetcher: Prefetcher = Depends(get_prefetcher),
 ) -> PaginatedResults[FilmGenreOut]:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
-    films = await film_service.get_data(page_number, page_size, genre, sort=sort)
+    cached = await response_cache.get(request, PaginatedResults[FilmGenreOut])
+    if cached:
+        return cached
+    if cursor is None:
+        check_page_number(page_number, page_size)
+        films = await film_service.get_data(page_number, page_size, genre, sort=sort)
+        next_cursor = Cursor.following(page_number, page_size, len(films))
+    else:
+        films, next_cursor = await film_service.get_page(page_size, genre, sort, cursor)
     films_out = [FilmGenreOut.from_film(film) for film in films]
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=messages.FILM_NOT_FOUND)
-    return PaginatedResults(results=films_out, page_size=page_size, page=page_number)
+    next_page = None
+    if settings.prefetch.next_page and cursor is None:
+        next_page = partial(film_service.get_data, page_number + 1, page_size, genre, sort=sort)
+    prefetcher.schedule(background_tasks, [film.id for film in films], next_page)
+    page = PaginatedResults[FilmGenreOut](results=films_out, page_size=page_size, page=page_number,
+                                          next_cursor=encode_cursor(request, next_cursor))
+    return await response_cache.set(request, page, collect_tags(films))
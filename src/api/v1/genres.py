@@ -6,14 +6,15 @@ from starlette.requests import Request
 from starlette import status
 
 from api.v1 import messages
+from api.v1.pagination import check_page_number, encode_cursor, get_cursor
 from models.genre import Genre
-from models.utils import PaginatedResults
+from models.utils import Cursor, PaginatedResults
 from services.auth import CheckAuth, get_check_auth_service
+from services.response_cache import ResponseCache, collect_tags, get_response_cache
 from services.genre import (
     GenreServiceID, get_genre_service_all,
     GenreServiceAll, get_genre_service_id
 )
-from limiter import rate_limit
 
 
 router = APIRouter()
@@ -22,21 +23,24 @@ router = APIRouter()
 @router.get('/{genre_id}/',
             response_model=Genre,
             description="Получение жанра по id")
-@rate_limit()
 async def genre_details(
         request: Request,
         genre_id: str,
         genre_service: GenreServiceID = Depends(get_genre_service_id),
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
 ) -> Genre:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
+    cached = await response_cache.get(request, Genre)
+    if cached:
+        return cached
     genre = await genre_service.get_data(genre_id)
     if not genre:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=messages.GENRE_NOT_FOUND)
 
-    return Genre(id=genre.id, name=genre.name)
+    return await response_cache.set(request, Genre(id=genre.id, name=genre.name), genre.cache_tags())
 
 
 @router.get('/',
@@ -49,14 +53,26 @@ async def all_genres(
         page_size: Annotated[int, Query(ge=1,
                                         description="Pagination page size")] = 10,
         sort: str | None = 'name',
+        cursor: Cursor | None = Depends(get_cursor),
         genre_service: GenreServiceAll = Depends(get_genre_service_all),
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
 ) -> PaginatedResults[Genre]:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
-    genres = await genre_service.get_data(page_number, page_size, sort)
+    cached = await response_cache.get(request, PaginatedResults[Genre])
+    if cached:
+        return cached
+    if cursor is None:
+        check_page_number(page_number, page_size)
+        genres = await genre_service.get_data(page_number, page_size, sort)
+        next_cursor = Cursor.following(page_number, page_size, len(genres))
+    else:
+        genres, next_cursor = await genre_service.get_page(page_size, sort, cursor)
     if not genres:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=messages.GENRE_NOT_FOUND)
 
-    return PaginatedResults(results=genres, page_size=page_size, page=page_number)
+    page = PaginatedResults[Genre](results=genres, page_size=page_size, page=page_number,
+                                   next_cursor=encode_cursor(request, next_cursor))
+    return await response_cache.set(request, page, collect_tags(genres))
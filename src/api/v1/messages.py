@@ -1,3 +1,6 @@
 FILM_NOT_FOUND = 'film not found'
 GENRE_NOT_FOUND = 'genre not found'
 PERSON_NOT_FOUND = 'person not found'
+CACHE_ADMIN_FORBIDDEN = 'invalid cache admin token'
+INVALID_CURSOR = 'invalid pagination cursor'
+PAGE_OUT_OF_WINDOW = 'page is out of result window, use next_cursor'
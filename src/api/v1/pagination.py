@@ -0,0 +1,53 @@
+import hashlib
+from http import HTTPStatus
+from typing import Annotated
+
+import orjson
+from fastapi import HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from starlette.requests import Request
+
+from api.v1 import messages
+from core.config import settings
+from models.utils import Cursor, InvalidCursorError
+
+# Параметры, которые не меняют выдачу: с ними курсор остаётся действительным
+PAGE_PARAMS = {'cursor', 'page_number', 'page_size'}
+
+
+# Курсор привязан к маршруту и параметрам выдачи: чужие значения search_after Elasticsearch отвергнет
+def _scope(request: Request) -> str:
+    params = sorted((name, value) for name, value in request.query_params.multi_items() if name not in PAGE_PARAMS)
+    return hashlib.sha1(orjson.dumps([request.url.path, params])).hexdigest()[:16]
+
+
+def get_cursor(
+        request: Request,
+        cursor: Annotated[str | None, Query(description="Pagination cursor from next_cursor, "
+                                                        "replaces page_number")] = None,
+) -> Cursor | None:
+    if cursor is None:
+        return None
+    try:
+        decoded = Cursor.decode(cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=messages.INVALID_CURSOR)
+    if decoded.scope != _scope(request) or decoded.offset >= settings.elasticsearch.max_result_window:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=messages.INVALID_CURSOR)
+    return decoded
+
+
+# Курсор следующей страницы должен оставаться в max_result_window: глубже выдача идёт только по next_cursor
+def check_page_number(page_number: int, page_size: int):
+    if page_number * page_size >= settings.elasticsearch.max_result_window:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=messages.PAGE_OUT_OF_WINDOW)
+
+
+def encode_cursor(request: Request, cursor: Cursor | None) -> str | None:
+    if cursor is None:
+        return None
+    return cursor.model_copy(update={'scope': _scope(request)}).encode()
+
+
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError) -> ORJSONResponse:
+    return ORJSONResponse({'detail': messages.INVALID_CURSOR}, status_code=HTTPStatus.BAD_REQUEST)
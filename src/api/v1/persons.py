@@ -1,15 +1,20 @@
+from functools import partial
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from starlette.requests import Request
 from starlette import status
 
 from api.v1 import messages
+from api.v1.pagination import check_page_number, encode_cursor, get_cursor
+from core.config import settings
 from models.film import FilmGenreOut
 from models.person import Person
-from models.utils import PaginatedResults
+from models.utils import Cursor, PaginatedResults
 from services.auth import CheckAuth, get_check_auth_service
+from services.prefetch import Prefetcher, get_prefetcher
+from services.response_cache import ResponseCache, collect_tags, get_response_cache
 from services.person import (
     get_person_service_id, PersonServiceID,
     get_person_service_search, PersonServiceSearch,
@@ -28,15 +33,20 @@ async def person_details(
         person_id: str,
         person_service: PersonServiceID = Depends(get_person_service_id),
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
 ) -> Person:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
+    cached = await response_cache.get(request, Person)
+    if cached:
+        return cached
     person = await person_service.get_data(person_id)
     if not person:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=messages.PERSON_NOT_FOUND)
 
-    return Person(id=person.id, full_name=person.full_name, films=person.films)
+    person_out = Person(id=person.id, full_name=person.full_name, films=person.films)
+    return await response_cache.set(request, person_out, person.cache_tags())
 
 
 @router.get('/search',
@@ -49,17 +59,29 @@ async def persons_search(
                                description="Pagination page number")] = 1,
         page_size: Annotated[int, Query(ge=1,
                              description="Pagination page size")] = 10,
+        cursor: Cursor | None = Depends(get_cursor),
         person_service: PersonServiceSearch = Depends(get_person_service_search),
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
 ) -> PaginatedResults[Person]:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
-    persons = await person_service.get_data(name, page_number, page_size)
+    cached = await response_cache.get(request, PaginatedResults[Person])
+    if cached:
+        return cached
+    if cursor is None:
+        check_page_number(page_number, page_size)
+        persons = await person_service.get_data(name, page_number, page_size)
+        next_cursor = Cursor.following(page_number, page_size, len(persons))
+    else:
+        persons, next_cursor = await person_service.get_page(name, page_size, cursor)
     if not persons:
         raise HTTPException(status_code=HTTPStatus.OK, detail=messages.PERSON_NOT_FOUND)
 
-    return PaginatedResults(results=persons, page_size=page_size, page=page_number)
+    page = PaginatedResults[Person](results=persons, page_size=page_size, page=page_number,
+                                    next_cursor=encode_cursor(request, next_cursor))
+    return await response_cache.set(request, page, collect_tags(persons))
 
 
 @router.get('/{person_id}/film/',
@@ -67,20 +89,38 @@ async def persons_search(
             description="Получение фильмов с участием персоны по id")
 async def films_by_persons(
         request: Request,
+        background_tasks: BackgroundTasks,
         person_id: str,
         page_number: Annotated[int, Query(ge=1,
                                           description="Pagination page number")] = 1,
         page_size: Annotated[int, Query(ge=1,
                                         description="Pagination page size")] = 10,
+        cursor: Cursor | None = Depends(get_cursor),
         person_service: FilmByPersonService = Depends(get_film_by_person_service),
         check_auth: CheckAuth = Depends(get_check_auth_service),
+        response_cache: ResponseCache = Depends(get_response_cache),
+        prefetcher: Prefetcher = Depends(get_prefetcher),
 ) -> PaginatedResults[FilmGenreOut]:
     user = await check_auth.check_authorization(request)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please login')
-    films = await person_service.get_data(person_id, page_number, page_size)
+    cached = await response_cache.get(request, PaginatedResults[FilmGenreOut])
+    if cached:
+        return cached
+    if cursor is None:
+        check_page_number(page_number, page_size)
+        films = await person_service.get_data(person_id, page_number, page_size)
+        next_cursor = Cursor.following(page_number, page_size, len(films))
+    else:
+        films, next_cursor = await person_service.get_page(person_id, page_size, cursor)
     if not films:
         raise HTTPException(status_code=HTTPStatus.OK, detail=messages.PERSON_NOT_FOUND)
     films_out = [FilmGenreOut.from_film(film) for film in films]
+    next_page = None
+    if settings.prefetch.next_page and cursor is None:
+        next_page = partial(person_service.get_data, person_id, page_number + 1, page_size)
+    prefetcher.schedule(background_tasks, [film.id for film in films], next_page)
 
-    return PaginatedResults(results=films_out, page_size=page_size, page=page_number)
+    page = PaginatedResults[FilmGenreOut](results=films_out, page_size=page_size, page=page_number,
+                                          next_cursor=encode_cursor(request, next_cursor))
+    return await response_cache.set(request, page, collect_tags(films) | {'person:%s' % person_id})
@@ -3,7 +3,7 @@ import logging
 from pathlib import Path
 
 from dotenv import load_dotenv
-from pydantic import Field, BaseModel
+from pydantic import Field, BaseModel, model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -21,11 +21,25 @@ load_dotenv(f"{BASE_DIR}/.env")
 class RedisSettings(BaseSettings):
     host: str = Field(validation_alias='REDIS_HOST')
     port: int = Field(validation_alias='REDIS_PORT')
+    cache_nodes: str | None = Field(validation_alias='REDIS_CACHE_NODES', default=None)
+    socket_timeout: float = Field(validation_alias='REDIS_SOCKET_TIMEOUT_IN_SECONDS', default=0.5)
+    node_retry_interval: float = Field(validation_alias='REDIS_NODE_RETRY_INTERVAL_IN_SECONDS', default=5)
+
+    def cache_node_list(self) -> list[tuple[str, int]]:
+        if not self.cache_nodes:
+            return [(self.host, self.port)]
+        nodes = []
+        for node in self.cache_nodes.split(','):
+            host, port = node.strip().rsplit(':', 1)
+            nodes.append((host, int(port)))
+        return nodes
 
 
 class ElasticsearchSettings(BaseSettings):
     host: str = Field(validation_alias='ELASTIC_HOST')
     port: int = Field(validation_alias='ELASTIC_PORT')
+    # index.max_result_window индексов: дальше from + size Elasticsearch не отдаёт
+    max_result_window: int = Field(validation_alias='ELASTIC_MAX_RESULT_WINDOW', default=10000)
 
     def url(self):
         return f'http://{self.host}:{self.port}'
@@ -34,6 +48,129 @@ class ElasticsearchSettings(BaseSettings):
 class RateLimitSettings(BaseSettings):
     limit: int = Field(validation_alias='LIMIT', default=1000)
     interval: int = Field(validation_alias='INTERVAL', default=60)
+    redis_host: str | None = Field(validation_alias='RATE_LIMIT_REDIS_HOST', default=None)
+    redis_port: int | None = Field(validation_alias='RATE_LIMIT_REDIS_PORT', default=None)
+    mode: str = Field(validation_alias='RATE_LIMIT_MODE', default='redis')
+    sync_interval: float = Field(validation_alias='RATE_LIMIT_SYNC_INTERVAL_IN_SECONDS', default=0.2)
+    penalty_time: float = Field(validation_alias='RATE_LIMIT_PENALTY_IN_SECONDS', default=10)
+    # Счётчик лимита отправляется в одном пайплайне с первым чтением кеша, если Redis общий
+    batching: bool = Field(validation_alias='RATE_LIMIT_BATCHING', default=True)
+    # Маршруты (GET), которые начинают работу с чтения кеша. Остальные проверяются до обработки
+    batched_routes: set[str] = Field(validation_alias='RATE_LIMIT_BATCHED_ROUTES', default={
+        '/api/v1/films/{film_id}/',
+        '/api/v1/films/search',
+        '/api/v1/films/',
+        '/api/v1/persons/{person_id}/',
+        '/api/v1/persons/search',
+        '/api/v1/persons/{person_id}/film/',
+        '/api/v1/genres/{genre_id}/',
+        '/api/v1/genres/',
+    })
+    # Квоты по тарифам в JSON: {"anonymous": {"limit": 100}, "premium": {"limit": 5000, "interval": 60}}
+    tiers: dict[str, dict[str, int]] = Field(validation_alias='RATE_LIMIT_TIERS', default={})
+    # Тариф для role_id из JWT, остальные пользователи получают тариф "user"
+    role_tiers: dict[str, str] = Field(validation_alias='RATE_LIMIT_ROLE_TIERS', default={})
+    # Стоимость запроса к маршруту в единицах квоты, 0 - маршрут не ограничивается
+    route_costs: dict[str, int] = Field(validation_alias='RATE_LIMIT_ROUTE_COSTS', default={
+        '/api/v1/films/search': 5,
+        '/api/v1/persons/search': 5,
+        '/api/v1/films/': 2,
+        '/api/v1/persons/{person_id}/film/': 2,
+        '/api/openapi': 0,
+        '/api/openapi.json': 0,
+    })
+
+    def tier_limits(self, tier: str) -> tuple[int, int]:
+        quota = self.tiers.get(tier, {})
+        return quota.get('limit', self.limit), quota.get('interval', self.interval)
+
+    # Запрос дороже всей квоты тарифа не пройдёт никогда, а его попытки будут продлевать блокировку
+    @model_validator(mode='after')
+    def check_route_costs(self) -> 'RateLimitSettings':
+        max_cost = max(self.route_costs.values(), default=1)
+        for tier in {'anonymous', 'user', *self.tiers, *self.role_tiers.values()}:
+            limit, _ = self.tier_limits(tier)
+            if limit < max_cost:
+                raise ValueError('limit %s of tier %r is less than route cost %s' % (limit, tier, max_cost))
+        return self
+
+
+class LocalCacheSettings(BaseSettings):
+    max_size: int = Field(validation_alias='LOCAL_CACHE_MAX_SIZE', default=1000)
+    ttl: int = Field(validation_alias='LOCAL_CACHE_TTL_IN_SECONDS', default=10)
+    snapshot_path: str | None = Field(validation_alias='LOCAL_CACHE_SNAPSHOT_PATH', default=None)
+
+
+class SharedCacheSettings(BaseSettings):
+    enabled: bool = Field(validation_alias='SHARED_CACHE_ENABLED', default=True)
+    name: str = Field(validation_alias='SHARED_CACHE_NAME', default='movies_cache')
+    slots: int = Field(validation_alias='SHARED_CACHE_SLOTS', default=2048)
+    slot_size: int = Field(validation_alias='SHARED_CACHE_SLOT_SIZE_IN_BYTES', default=8192)
+    ttl: int = Field(validation_alias='SHARED_CACHE_TTL_IN_SECONDS', default=30)
+
+
+class StaleCacheSettings(BaseSettings):
+    stale_time: int = Field(validation_alias='CACHE_STALE_TIME_IN_SECONDS', default=60)
+    refresh_ahead_ratio: float = Field(validation_alias='CACHE_REFRESH_AHEAD_RATIO', default=0.2)
+    refresh_ahead_hits: int = Field(validation_alias='CACHE_REFRESH_AHEAD_HITS', default=50)
+
+
+class CacheCodecSettings(BaseSettings):
+    compress_threshold: int = Field(validation_alias='CACHE_COMPRESS_THRESHOLD_IN_BYTES', default=2048)
+    compress_level: int = Field(validation_alias='CACHE_COMPRESS_LEVEL', default=1)
+
+
+class WarmupSettings(BaseSettings):
+    enabled: bool = Field(validation_alias='CACHE_WARMUP_ENABLED', default=True)
+    films_per_genre: int = Field(validation_alias='CACHE_WARMUP_FILMS_PER_GENRE', default=20)
+    main_pages: int = Field(validation_alias='CACHE_WARMUP_MAIN_PAGES', default=3)
+    page_size: int = Field(validation_alias='CACHE_WARMUP_PAGE_SIZE', default=10)
+    concurrency: int = Field(validation_alias='CACHE_WARMUP_CONCURRENCY', default=8)
+    timeout: int = Field(validation_alias='CACHE_WARMUP_TIMEOUT_IN_SECONDS', default=30)
+
+
+class CacheWriterSettings(BaseSettings):
+    enabled: bool = Field(validation_alias='CACHE_WRITE_BEHIND_ENABLED', default=True)
+    queue_size: int = Field(validation_alias='CACHE_WRITE_BEHIND_QUEUE_SIZE', default=10000)
+    batch_size: int = Field(validation_alias='CACHE_WRITE_BEHIND_BATCH_SIZE', default=100)
+
+
+class ResponseCacheSettings(BaseSettings):
+    enabled: bool = Field(validation_alias='RESPONSE_CACHE_ENABLED', default=False)
+    ttl: int = Field(validation_alias='RESPONSE_CACHE_EXPIRE_IN_SECONDS', default=60)
+
+
+class PrefetchSettings(BaseSettings):
+    enabled: bool = Field(validation_alias='PREFETCH_ENABLED', default=False)
+    next_page: bool = Field(validation_alias='PREFETCH_NEXT_PAGE', default=True)
+    concurrency: int = Field(validation_alias='PREFETCH_CONCURRENCY', default=4)
+    max_delay: float = Field(validation_alias='PREFETCH_MAX_DELAY_IN_SECONDS', default=0.2)
+    cooldown: float = Field(validation_alias='PREFETCH_COOLDOWN_IN_SECONDS', default=30)
+
+
+class ResultWindowSettings(BaseSettings):
+    enabled: bool = Field(validation_alias='RESULT_WINDOW_ENABLED', default=True)
+    size: int = Field(validation_alias='RESULT_WINDOW_SIZE', default=500)
+
+
+class SearchCacheSettings(BaseSettings):
+    admission_threshold: int = Field(validation_alias='SEARCH_CACHE_ADMISSION_THRESHOLD', default=2)
+    sketch_width: int = Field(validation_alias='SEARCH_CACHE_SKETCH_WIDTH', default=1 << 16)
+
+
+class CachePolicy(BaseModel):
+    ttl: int
+    jitter: float = 0.0
+    negative_ttl: int = 0
+    max_payload_bytes: int = 0
+    enabled: bool = True
+
+
+class CachePolicySettings(BaseSettings):
+    jitter: float = Field(validation_alias='CACHE_TTL_JITTER', default=0.1)
+    max_payload_bytes: int = Field(validation_alias='CACHE_MAX_PAYLOAD_IN_BYTES', default=512 * 1024)
+    # Переопределения по эндпоинтам в JSON, например {"film_search": {"ttl": 30, "enabled": false}}
+    overrides: dict[str, dict] = Field(validation_alias='CACHE_POLICIES', default={})
 
 
 class Settings(BaseSettings):
@@ -41,10 +178,54 @@ class Settings(BaseSettings):
     person_cache_expire: int = Field(validation_alias='PERSON_CACHE_EXPIRE_IN_SECONDS', default=60 * 5)
     film_cache_expire: int = Field(validation_alias='FILM_CACHE_EXPIRE_IN_SECONDS', default=60 * 5)
     genre_cache_expire: int = Field(validation_alias='GENRE_CACHE_EXPIRE_IN_SECONDS', default=60 * 5)
+    film_sort_cache_expire: int = Field(validation_alias='FILM_SORT_CACHE_EXPIRE_IN_SECONDS', default=60)
+    film_search_cache_expire: int = Field(validation_alias='FILM_SEARCH_CACHE_EXPIRE_IN_SECONDS', default=60)
+    person_search_cache_expire: int = Field(validation_alias='PERSON_SEARCH_CACHE_EXPIRE_IN_SECONDS', default=60)
+    film_by_person_cache_expire: int = Field(validation_alias='FILM_BY_PERSON_CACHE_EXPIRE_IN_SECONDS',
+                                             default=60 * 5)
+    negative_cache_expire: int = Field(validation_alias='NEGATIVE_CACHE_EXPIRE_IN_SECONDS', default=30)
+    cache_tag_expire: int = Field(validation_alias='CACHE_TAG_EXPIRE_IN_SECONDS', default=60 * 60 * 24)
+    cache_admin_token: str | None = Field(validation_alias='CACHE_ADMIN_TOKEN', default=None)
+    cache_stats_sample_size: int = Field(validation_alias='CACHE_STATS_SAMPLE_SIZE', default=1000)
+    cache_generation_poll_interval: int = Field(validation_alias='CACHE_GENERATION_POLL_INTERVAL_IN_SECONDS',
+                                                default=30)
     auth_service_url: str = Field(validation_alias='AUTH_SERVICE_URL', default='http://localhost:82')
     redis: RedisSettings = RedisSettings()
     elasticsearch: ElasticsearchSettings = ElasticsearchSettings()
     rate_limit: RateLimitSettings = RateLimitSettings()
+    local_cache: LocalCacheSettings = LocalCacheSettings()
+    shared_cache: SharedCacheSettings = SharedCacheSettings()
+    stale_cache: StaleCacheSettings = StaleCacheSettings()
+    cache_codec: CacheCodecSettings = CacheCodecSettings()
+    warmup: WarmupSettings = WarmupSettings()
+    cache_writer: CacheWriterSettings = CacheWriterSettings()
+    response_cache: ResponseCacheSettings = ResponseCacheSettings()
+    cache_policy_config: CachePolicySettings = CachePolicySettings()
+    search_cache: SearchCacheSettings = SearchCacheSettings()
+    result_window: ResultWindowSettings = ResultWindowSettings()
+    prefetch: PrefetchSettings = PrefetchSettings()
+
+    def cache_policy(self, name: str) -> CachePolicy:
+        ttls = {
+            'film': self.film_cache_expire,
+            'film_sort': self.film_sort_cache_expire,
+            'film_search': self.film_search_cache_expire,
+            'genre': self.genre_cache_expire,
+            'genre_list': self.genre_cache_expire,
+            'person': self.person_cache_expire,
+            'person_search': self.person_search_cache_expire,
+            'film_by_person': self.film_by_person_cache_expire,
+            'response': self.response_cache.ttl,
+        }
+        policy = {
+            'ttl': ttls[name],
+            'jitter': self.cache_policy_config.jitter,
+            'negative_ttl': self.negative_cache_expire,
+            'max_payload_bytes': self.cache_policy_config.max_payload_bytes,
+            'enabled': self.response_cache.enabled if name == 'response' else True,
+        }
+        policy.update(self.cache_policy_config.overrides.get(name, {}))
+        return CachePolicy(**policy)
 
 
 settings = Settings()
@@ -1,8 +1,27 @@
 from abc import ABC, abstractmethod
+from typing import Type
 
-from elasticsearch import AsyncElasticsearch
+from elasticsearch import AsyncElasticsearch, NotFoundError, RequestError
+from pydantic import BaseModel
 from redis.asyncio.client import Redis
 
+from core.config import settings
+from models.utils import Cursor, InvalidCursorError
+
+# Уникальное поле в конце сортировки: без него search_after пропускает документы с равными значениями
+TIEBREAKER = {'id': 'asc'}
+
+# Из ответа Elasticsearch оставляем только то, что разбирается в модели
+IDS_FILTER_PATH = 'hits.hits._id'
+HITS_FILTER_PATH = 'hits.hits._source,hits.hits.sort'
+DOC_FILTER_PATH = '_source'
+DOCS_FILTER_PATH = 'docs.found,docs._source'
+
+
+# Из индекса запрашиваются только поля модели, в которую разбирается документ
+def source_fields(model_class: Type[BaseModel]) -> list[str]:
+    return list(model_class.model_fields)
+
 
 class AbstractStorage(ABC):
     @abstractmethod
@@ -22,6 +41,58 @@ class ElasticStorage(AbstractStorage):
     def get_list(self, *args, **kwargs):
         pass
 
+    # Без модели запрашиваются только id документов
+    async def _hits(self, index: str, body: dict, model_class: Type[BaseModel] | None = None) -> list[dict]:
+        if model_class is None:
+            body['_source'] = False
+            filter_path = IDS_FILTER_PATH
+        else:
+            body['_source'] = source_fields(model_class)
+            filter_path = HITS_FILTER_PATH
+        doc = await self._elastic.search(index=index, body=body, filter_path=filter_path)
+        # Пустая выдача после filter_path приходит без ключа hits
+        return doc.get('hits', {}).get('hits', [])
+
+    # from + size не может выходить за max_result_window: страница на границе обрезается
+    @staticmethod
+    def _window(body: dict, offset: int, page_size: int) -> int:
+        body['from'] = offset
+        body['size'] = max(min(page_size, settings.elasticsearch.max_result_window - offset), 0)
+        return body['size']
+
+    # Глубокие страницы продолжаются от значений сортировки, а не пропуском from документов
+    @classmethod
+    def _paginate(cls, body: dict, page_size: int, cursor: Cursor) -> dict:
+        if cursor.after is not None:
+            body['size'] = page_size
+            body['search_after'] = cursor.after
+        else:
+            cls._window(body, cursor.offset, page_size)
+        return body
+
+    # Полная страница, даже обрезанная по max_result_window, продолжается через search_after
+    @staticmethod
+    def _next_cursor(hits: list[dict], size: int) -> Cursor | None:
+        if not hits or len(hits) < size:
+            return None
+        return Cursor(after=hits[-1]['sort'])
+
+    async def _page(self,
+                    index: str,
+                    body: dict,
+                    model_class: Type[BaseModel],
+                    page_size: int,
+                    cursor: Cursor) -> tuple[list, Cursor | None]:
+        body = self._paginate(body, page_size, cursor)
+        try:
+            hits = await self._hits(index, body, model_class)
+        except NotFoundError:
+            return [], None
+        except RequestError as exc:
+            # search_after не подходит к сортировке запроса: курсор изменён вручную или взят из другой выдачи
+            raise InvalidCursorError('Invalid cursor') from exc
+        return [model_class(**hit['_source']) for hit in hits], self._next_cursor(hits, body['size'])
+
 
 class AbstractRedis(ABC):
 
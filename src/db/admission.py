@@ -0,0 +1,48 @@
+import hashlib
+
+# Счётчики 4-битные, как в TinyLFU: частоту выше 15 различать незачем
+MAX_COUNT = 15
+DEPTH = 4
+HALVE = bytes(count >> 1 for count in range(256))
+
+
+# Count-min sketch частот обращений. После sample_size обращений все счётчики
+# делятся пополам, чтобы старые популярные запросы постепенно вытеснялись новыми.
+class FrequencySketch:
+    def __init__(self, width: int, sample_size: int | None = None):
+        self._width = width
+        self._table = bytearray(width * DEPTH)
+        self._sample_size = sample_size or width * 10
+        self._additions = 0
+
+    def _indexes(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=DEPTH * 4).digest()
+        return [
+            row * self._width + int.from_bytes(digest[row * 4:row * 4 + 4], 'little') % self._width
+            for row in range(DEPTH)
+        ]
+
+    def estimate(self, key: str) -> int:
+        return min(self._table[index] for index in self._indexes(key))
+
+    def increment(self, key: str):
+        for index in self._indexes(key):
+            if self._table[index] < MAX_COUNT:
+                self._table[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._table = bytearray(self._table.translate(HALVE))
+            self._additions //= 2
+
+
+# Значение попадает в кеш, только если ключ уже запрашивали не меньше threshold раз
+class FrequencyAdmission:
+    def __init__(self, threshold: int, width: int):
+        self._threshold = threshold
+        self._sketch = FrequencySketch(width)
+
+    def record(self, key: str):
+        self._sketch.increment(key)
+
+    def admit(self, key: str) -> bool:
+        return self._sketch.estimate(key) >= self._threshold
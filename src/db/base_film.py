@@ -1,7 +1,11 @@
+from typing import Type
+
 from elasticsearch import AsyncElasticsearch, NotFoundError
+from pydantic import BaseModel
 
-from db.abstract import ElasticStorage
+from db.abstract import DOC_FILTER_PATH, DOCS_FILTER_PATH, TIEBREAKER, ElasticStorage, source_fields
 from models.film import Film, MainFilmInformation
+from models.utils import Cursor, ResultIds
 
 
 class BaseElasticFilmID(ElasticStorage):
@@ -10,73 +14,111 @@ class BaseElasticFilmID(ElasticStorage):
 
     async def get_by_id(self, object_id: str) -> Film | None:
         try:
-            doc = await self._elastic.get(index='movies', id=object_id)
+            doc = await self._elastic.get(index='movies', id=object_id,
+                                          _source_includes=source_fields(Film), filter_path=DOC_FILTER_PATH)
         except NotFoundError:
             return None
         return Film(**doc['_source'])
 
+    async def get_many(self, object_ids: list[str], model_class: Type[BaseModel] = Film) -> list:
+        if not object_ids:
+            return []
+        doc = await self._elastic.mget(index='movies', body={'ids': object_ids},
+                                       _source_includes=source_fields(model_class), filter_path=DOCS_FILTER_PATH)
+        return [model_class(**item['_source']) for item in doc.get('docs', []) if item.get('found')]
+
 
 class BaseElasticFilmSearch(ElasticStorage):
     def __init__(self, elastic: AsyncElasticsearch):
         self._elastic = elastic
 
+    @staticmethod
+    def _query(search) -> dict:
+        return {
+            "multi_match": {
+                "query": search,
+                "fields": ["title", "description"]
+            }
+        }
+
+    async def get_ids(self, search, size) -> ResultIds:
+        body = {
+            "query": self._query(search),
+            "sort": ["_score", TIEBREAKER],
+            "size": size
+        }
+        try:
+            hits = await self._hits('movies', body)
+        except NotFoundError:
+            return ResultIds(ids=[])
+        return ResultIds(ids=[hit['_id'] for hit in hits])
+
     async def get_list(self, search, page_number, page_size) -> list[MainFilmInformation] | None:
         body = {
-            "query": {
-                "multi_match": {
-                    "query": search,
-                    "fields": ["title", "description"]
-                }
-            },
-            "size": page_size,
-            "from": (page_number - 1) * page_size
+            "query": self._query(search),
+            "sort": ["_score", TIEBREAKER],
         }
+        if not self._window(body, (page_number - 1) * page_size, page_size):
+            return []
         try:
-            doc = await self._elastic.search(index='movies', body=body)
-            answer = [MainFilmInformation(**hit['_source']) for hit in doc['hits']['hits']]
+            hits = await self._hits('movies', body, MainFilmInformation)
+            answer = [MainFilmInformation(**hit['_source']) for hit in hits]
             return answer
         except NotFoundError:
             return []
 
+    async def get_page(self, search, page_size, cursor: Cursor) -> tuple[list[MainFilmInformation], Cursor | None]:
+        body = {"query": self._query(search), "sort": ["_score", TIEBREAKER]}
+        return await self._page('movies', body, MainFilmInformation, page_size, cursor)
+
 
 class BaseElasticFilmSort(ElasticStorage):
     def __init__(self, elastic: AsyncElasticsearch):
         self._elastic = elastic
 
+    @staticmethod
+    def _body(genre, sort) -> dict:
+        direction = 'desc' if sort.startswith('-') else 'asc'
+        field = sort.lstrip('-')
+        body = {'sort': [{field: {'order': direction}}, TIEBREAKER]}
+        if genre:
+            body['query'] = {
+                'bool': {
+                    'filter': [
+                        {'nested': {
+                            'path': 'genres_list',
+                            'query': {
+                                'bool': {
+                                    'must': [
+                                        {'match': {'genres_list.id': genre}},
+                                    ]
+                                }
+                            }
+                        }},
+                    ],
+                }
+            }
+        return body
+
+    async def get_ids(self, genre, sort, size) -> ResultIds | None:
+        body = self._body(genre, sort)
+        body['size'] = size
+        try:
+            hits = await self._hits('movies', body)
+        except NotFoundError:
+            return None
+        return ResultIds(ids=[hit['_id'] for hit in hits])
+
     async def get_list(self, page_number, page_size, genre, sort) -> list[MainFilmInformation] | None:
+        query = self._body(genre, sort)
+        if not self._window(query, (page_number - 1) * page_size, page_size):
+            return []
         try:
-            direction = 'desc' if sort.startswith('-') else 'asc'
-            field = sort.lstrip('-')
-            if not genre:
-                query = {
-                    'sort': [{field: {'order': direction}}],
-                    'size': page_size,
-                    'from': (page_number - 1) * page_size
-                }
-            else:
-                query = {
-                    'query': {
-                        'bool': {
-                            'filter': [
-                                {'nested': {
-                                    'path': 'genres_list',
-                                    'query': {
-                                        'bool': {
-                                            'must': [
-                                                {'match': {'genres_list.id': genre}},
-                                            ]
-                                        }
-                                    }
-                                }},
-                            ],
-                        }
-                    },
-                    'sort': [{field: {'order': direction}}],
-                    'size': page_size,
-                    'from': (page_number - 1) * page_size
-                }
-            doc = await self._elastic.search(index='movies', body=query)
+            hits = await self._hits('movies', query, MainFilmInformation)
         except NotFoundError:
             return None
-        answer = [MainFilmInformation(**hit['_source']) for hit in doc['hits']['hits']]
+        answer = [MainFilmInformation(**hit['_source']) for hit in hits]
         return answer
+
+    async def get_page(self, page_size, genre, sort, cursor: Cursor) -> tuple[list[MainFilmInformation], Cursor | None]:
+        return await self._page('movies', self._body(genre, sort), MainFilmInformation, page_size, cursor)
@@ -1,6 +1,7 @@
-from db.abstract import ElasticStorage
+from db.abstract import DOC_FILTER_PATH, TIEBREAKER, ElasticStorage, source_fields
 from elasticsearch import AsyncElasticsearch, NotFoundError
 from models.genre import Genre
+from models.utils import Cursor
 
 
 class BaseElasticGenreID(ElasticStorage):
@@ -9,7 +10,8 @@ class BaseElasticGenreID(ElasticStorage):
 
     async def get_by_id(self, genre_id: str) -> Genre | None:
         try:
-            doc = await self._elastic.get(index='genres', id=genre_id)
+            doc = await self._elastic.get(index='genres', id=genre_id,
+                                          _source_includes=source_fields(Genre), filter_path=DOC_FILTER_PATH)
         except NotFoundError:
             return None
         return Genre(**doc['_source'])
@@ -19,24 +21,32 @@ class BaseElasticAllGenre(ElasticStorage):
     def __init__(self, elastic: AsyncElasticsearch):
         self._elastic = elastic
 
+    @staticmethod
+    def _sort(sort: str) -> list:
+        direction = 'desc' if sort.startswith('-') else 'asc'
+        return [{sort.lstrip('-'): {"order": direction}}, TIEBREAKER]
+
     async def get_list(self,
                        page_number: int,
                        page_size: int,
                        sort: str | None) -> list[Genre] | None:
+        body = {
+            "query": {"match_all": {}},
+            "sort": self._sort(sort)
+        }
+        if not self._window(body, (page_number - 1) * page_size, page_size):
+            return []
         try:
-            direction = 'desc' if sort.startswith('-') else 'asc'
-            field = sort.lstrip('-')
-            doc = await self._elastic.search(
-                index='genres',
-                body={
-                    "query": {"match_all": {}},
-                    "size": page_size,
-                    "from": (page_number - 1) * page_size,
-                    "sort": [{field: {"order": direction}}]
-                }
-            )
+            hits = await self._hits('genres', body, Genre)
         except NotFoundError:
             return None
 
-        genres = [Genre(**doc['_source']) for doc in doc['hits']['hits']]
+        genres = [Genre(**doc['_source']) for doc in hits]
         return genres
+
+    async def get_page(self,
+                       page_size: int,
+                       sort: str | None,
+                       cursor: Cursor) -> tuple[list[Genre], Cursor | None]:
+        body = {"query": {"match_all": {}}, "sort": self._sort(sort)}
+        return await self._page('genres', body, Genre, page_size, cursor)
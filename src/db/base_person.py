@@ -1,8 +1,9 @@
 from elasticsearch import AsyncElasticsearch, NotFoundError
 
-from db.abstract import ElasticStorage
+from db.abstract import DOC_FILTER_PATH, TIEBREAKER, ElasticStorage, source_fields
 from models.film import MainFilmInformation
 from models.person import Person
+from models.utils import Cursor
 
 
 class BaseElasticPersonID(ElasticStorage):
@@ -11,7 +12,8 @@ class BaseElasticPersonID(ElasticStorage):
 
     async def get_by_id(self, object_id: str) -> Person | None:
         try:
-            doc = await self._elastic.get(index='persons', id=object_id)
+            doc = await self._elastic.get(index='persons', id=object_id,
+                                          _source_includes=source_fields(Person), filter_path=DOC_FILTER_PATH)
         except NotFoundError:
             return None
         return Person(**doc['_source'])
@@ -21,8 +23,9 @@ class BaseElasticPersonSearch(ElasticStorage):
     def __init__(self, elastic: AsyncElasticsearch):
         self._elastic = elastic
 
-    async def get_list(self, person_name, page_number, page_size) -> list[Person] | None:
-        body = {
+    @staticmethod
+    def _body(person_name) -> dict:
+        return {
             'query': {
                 'bool': {
                     'must': [
@@ -30,33 +33,34 @@ class BaseElasticPersonSearch(ElasticStorage):
                     ]
                 }
             },
-            'size': page_size,
-            'from': (page_number - 1) * page_size
+            'sort': ['_score', TIEBREAKER]
         }
+
+    async def get_list(self, person_name, page_number, page_size) -> list[Person] | None:
+        body = self._body(person_name)
+        if not self._window(body, (page_number - 1) * page_size, page_size):
+            return []
         try:
-            doc = await self._elastic.search(
-                index='persons',
-                body=body
-            )
+            hits = await self._hits('persons', body, Person)
         except NotFoundError:
             return []
-        answer = [Person(**hit['_source']) for hit in doc['hits']['hits']]
+        answer = [Person(**hit['_source']) for hit in hits]
         return answer
 
+    async def get_page(self, person_name, page_size, cursor: Cursor) -> tuple[list[Person], Cursor | None]:
+        return await self._page('persons', self._body(person_name), Person, page_size, cursor)
+
 
 class BaseElasticFilmByPerson(ElasticStorage):
     def __init__(self, elastic: AsyncElasticsearch):
         self._elastic = elastic
 
-    async def get_list(
-            self,
-            person_id: str,
-            page_number: int,
-            page_size: int
-    ) -> list[MainFilmInformation] | None:
-        body = {
+    @staticmethod
+    def _body(person_id: str) -> dict:
+        return {
             'sort': [
-                {'imdb_rating': 'desc'}
+                {'imdb_rating': 'desc'},
+                TIEBREAKER
             ],
             'query': {
                 'bool': {
@@ -93,16 +97,29 @@ class BaseElasticFilmByPerson(ElasticStorage):
                         }},
                     ]
                 }
-            },
-            'size': page_size,
-            'from': (page_number - 1) * page_size
+            }
         }
+
+    async def get_list(
+            self,
+            person_id: str,
+            page_number: int,
+            page_size: int
+    ) -> list[MainFilmInformation] | None:
+        body = self._body(person_id)
+        if not self._window(body, (page_number - 1) * page_size, page_size):
+            return []
         try:
-            doc = await self._elastic.search(
-                index='movies',
-                body=body
-            )
+            hits = await self._hits('movies', body, MainFilmInformation)
         except NotFoundError:
             return []
-        answer = [MainFilmInformation(**hit['_source']) for hit in doc['hits']['hits']]
+        answer = [MainFilmInformation(**hit['_source']) for hit in hits]
         return answer
+
+    async def get_page(
+            self,
+            person_id: str,
+            page_size: int,
+            cursor: Cursor
+    ) -> tuple[list[MainFilmInformation], Cursor | None]:
+        return await self._page('movies', self._body(person_id), MainFilmInformation, page_size, cursor)
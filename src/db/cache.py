@@ -1,11 +1,29 @@
-import json
+import asyncio
+import hashlib
+import logging
+import random
+import time
 from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Type
+from weakref import WeakSet
 
 import orjson
 from redis.asyncio import Redis
-from typing import Type
 from pydantic import BaseModel
 
+from db import cache_writer, request_batch, shared_cache, snapshot
+from db.admission import FrequencyAdmission
+from db.cache_stats import cache_stats
+from db.cache_writer import TAG_PREFIX, write_entry
+from db.codec import MISSING, CacheCodec
+from db.generation import generations
+from db.redis import ShardedRedis
+
+logger = logging.getLogger(__name__)
+
+HITS_TRACK_LIMIT = 10000
+
 
 class AbstractCache(ABC):
     @abstractmethod
@@ -13,46 +31,515 @@ class AbstractCache(ABC):
         ...
 
     @abstractmethod
-    def set(self, key: str, value: str):
+    def get_with_ttl(self, key: str):
+        ...
+
+    @abstractmethod
+    def get_many(self, keys: list[str]):
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: int | None = None, tags: Iterable[str] = ()):
         ...
 
 
 class RedisCacheStorage(AbstractCache):
-    def __init__(self, redis: Redis, cache_time: int):
+    def __init__(self,
+                 redis: ShardedRedis,
+                 cache_time: int,
+                 stale_time: int = 0,
+                 tag_time: int = 60 * 60 * 24,
+                 jitter: float = 0.0):
         self._redis = redis
         self._cache_time = cache_time
+        self._stale_time = stale_time
+        self._tag_time = tag_time
+        self._jitter = jitter
 
-    async def get(self, key: str):
-        data = await self._redis.get(key)
+    @property
+    def cache_time(self) -> int:
+        return self._cache_time
+
+    @property
+    def stale_time(self) -> int:
+        return self._stale_time
+
+    # Чтения идут через пакет запроса: отложенные команды (счётчик лимита) уходят вместе с ними
+    @staticmethod
+    async def _get(node: Redis, key: str) -> bytes | None:
+        data, = await request_batch.execute(node, lambda pipe: pipe.get(key))
         return data
 
-    async def set(self, key: str, value: str):
-        await self._redis.set(key, value, ex=self._cache_time)
+    async def get(self, key: str):
+        return await self._redis.call(key, lambda node: self._get(node, key))
+
+    @staticmethod
+    async def _get_with_ttl(node: Redis, key: str) -> tuple[bytes | None, int]:
+        data, ttl = await request_batch.execute(node, lambda pipe: pipe.get(key).ttl(key))
+        return data, ttl
+
+    @staticmethod
+    async def _mget(node: Redis, keys: list[str]) -> list[bytes | None]:
+        values, = await request_batch.execute(node, lambda pipe: pipe.mget(keys))
+        return values
+
+    async def get_with_ttl(self, key: str) -> tuple[bytes | None, int]:
+        return await self._redis.call(key, lambda node: self._get_with_ttl(node, key), default=(None, -2))
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        groups = self._redis.group(keys)
+        results = await asyncio.gather(*(
+            self._redis.call_node(name, lambda node, names=names: self._mget(node, names), default=[None] * len(names))
+            for name, names in groups.items()
+        ))
+        found = {}
+        for names, values in zip(groups.values(), results):
+            found.update(zip(names, values))
+        return [found.get(key) for key in keys]
+
+    # Случайный разброс TTL, чтобы ключи одного пространства имён не истекали одновременно
+    def _with_jitter(self, ttl: int) -> int:
+        if self._jitter <= 0:
+            return ttl
+        return max(round(ttl * (1 + random.uniform(-self._jitter, self._jitter))), 1)
+
+    async def set(self, key: str, value: bytes, ttl: int | None = None, tags: Iterable[str] = ()):
+        if ttl is None:
+            ttl = self._with_jitter(self._cache_time) + self._stale_time
+        else:
+            ttl = self._with_jitter(ttl)
+        # Если запущен фоновый писатель, запрос не ждёт записи в Redis
+        if cache_writer.writer is not None:
+            cache_writer.writer.put(key, value, ttl, tags, self._tag_time)
+            return
+        pipe = self._redis.pipeline()
+        write_entry(pipe, key, value, ttl, tags, self._tag_time)
+        await pipe.execute()
+
+
+# Ключи, ещё живые на момент инвалидации
+async def _tag_members(node: Redis, tag_keys: list[str]) -> set[bytes]:
+    now = time.time()
+    async with node.pipeline(transaction=False) as pipe:
+        for tag_key in tag_keys:
+            pipe.zrangebyscore(tag_key, now, '+inf')
+        results = await pipe.execute()
+    return {key for members in results for key in members}
+
+
+async def invalidate_tags(redis: ShardedRedis, tags: Iterable[str]) -> int:
+    tag_keys = [TAG_PREFIX + tag for tag in tags]
+    if not tag_keys:
+        return 0
+
+    members = await asyncio.gather(*(
+        redis.call_node(name, lambda node, names=names: _tag_members(node, names), default=set())
+        for name, names in redis.group(tag_keys).items()
+    ))
+    keys = sorted({key.decode() for node_keys in members for key in node_keys})
+
+    deleted = await asyncio.gather(*(
+        redis.call_node(name, lambda node, names=names: node.delete(*names))
+        for name, names in redis.group(keys).items()
+    ))
+    # Если часть узлов недоступна, множества тегов остаются для повторной инвалидации
+    if None not in deleted:
+        await asyncio.gather(*(
+            redis.call_node(name, lambda node, names=names: node.delete(*names))
+            for name, names in redis.group(tag_keys).items()
+        ))
+    if shared_cache.shared_cache is not None:
+        for key in keys:
+            shared_cache.shared_cache.delete(key)
+    # Локальные кеши других воркеров догонят изменения в пределах своего TTL
+    for local in LocalCache.instances:
+        for key in keys:
+            local.delete(key)
+    return sum(count for count in deleted if count)
+
+
+TTL_BUCKETS = ((60, '<1m'), (300, '<5m'), (3600, '<1h'), (86400, '<1d'))
+LARGEST_KEYS = 10
+
+
+def _ttl_bucket(ttl: int) -> str:
+    if ttl < 0:
+        return 'persistent'
+    for limit, name in TTL_BUCKETS:
+        if ttl < limit:
+            return name
+    return '>=1d'
+
+
+async def _sample_node(node: Redis, sample_size: int) -> tuple[int, list[tuple[bytes, int, int]]]:
+    keys = []
+    async for key in node.scan_iter(count=min(sample_size, 1000)):
+        keys.append(key)
+        if len(keys) >= sample_size:
+            break
+
+    async with node.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.memory_usage(key)
+            pipe.ttl(key)
+        results = await pipe.execute() if keys else []
+    return await node.dbsize(), list(zip(keys, results[::2], results[1::2]))
+
+
+async def sample_keyspace(redis: ShardedRedis, sample_size: int) -> dict:
+    per_node = max(sample_size // len(redis.nodes), 1)
+    samples = await asyncio.gather(*(
+        redis.call_node(name, lambda node: _sample_node(node, per_node), default=(0, []))
+        for name in redis.nodes
+    ))
+
+    namespaces = {}
+    for _, sample in samples:
+        for key, size, ttl in sample:
+            key = key.decode()
+            size = size or 0
+            namespace = key.split(':', 1)[0]
+            summary = namespaces.setdefault(namespace, {'keys': 0, 'bytes': 0, 'ttl': {}, 'largest': []})
+            summary['keys'] += 1
+            summary['bytes'] += size
+            bucket = _ttl_bucket(ttl)
+            summary['ttl'][bucket] = summary['ttl'].get(bucket, 0) + 1
+            summary['largest'].append((size, key))
+
+    for summary in namespaces.values():
+        largest = sorted(summary['largest'], reverse=True)[:LARGEST_KEYS]
+        summary['largest'] = [{'key': key, 'bytes': size} for size, key in largest]
+
+    return {
+        'total_keys': sum(total for total, _ in samples),
+        'sampled_keys': sum(len(sample) for _, sample in samples),
+        'namespaces': namespaces,
+    }
+
+
+def save_local_caches(path: str, generation: str):
+    entries = [entry for local in LocalCache.instances for entry in local.snapshot_entries()]
+    # Невостребованные записи прошлого снимка тоже переживают перезапуск
+    if snapshot.snapshot is not None:
+        entries.extend(snapshot.snapshot.entries())
+    try:
+        count = snapshot.save_snapshot(path, generation, entries)
+    except OSError as exc:
+        logger.warning('Local cache snapshot was not saved: %r', exc)
+        return
+    logger.info('Local cache snapshot saved: %s entries', count)
+
+
+# LRU-кеш уровня процесса перед Redis: хранит уже десериализованные модели
+class LocalCache:
+    instances: WeakSet['LocalCache'] = WeakSet()
+
+    def __init__(self, max_size: int, ttl: float, codec: CacheCodec | None = None):
+        self._max_size = max_size
+        self._ttl = ttl
+        # Кодек нужен только для снимка на диск; без него хранятся готовые байты
+        self._codec = codec
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        LocalCache.instances.add(self)
+
+    def _from_snapshot(self, key: str):
+        raw, ttl = snapshot.snapshot.pop(key)
+        if raw is None:
+            return None
+        value = self._codec.decode(raw) if self._codec is not None else raw
+        if value is not None:
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            if snapshot.snapshot is not None:
+                return self._from_snapshot(key)
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        ttl = self._ttl if ttl is None else min(ttl, self._ttl)
+        if self._max_size <= 0 or ttl <= 0:
+            return
+        if snapshot.snapshot is not None:
+            snapshot.snapshot.discard(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+        if snapshot.snapshot is not None:
+            snapshot.snapshot.discard(key)
+
+    def clear(self):
+        self._data.clear()
+
+    def snapshot_entries(self) -> Iterator[tuple[str, float, bytes]]:
+        now = time.monotonic()
+        for key, (expires_at, value) in list(self._data.items()):
+            if expires_at <= now:
+                continue
+            if self._codec is not None:
+                value = self._codec.encode(value)
+            elif not isinstance(value, bytes):
+                continue
+            yield key, expires_at - now, value
 
 
 class Cache:
-    def __init__(self, model_class: Type[BaseModel], storage: AbstractCache):
+    def __init__(self,
+                 model_class: Type[BaseModel],
+                 storage: AbstractCache,
+                 local: LocalCache | None = None,
+                 refresh_ahead_ratio: float = 0.0,
+                 refresh_ahead_hits: int = 0,
+                 namespace: str | None = None,
+                 codec: CacheCodec | None = None,
+                 negative_cache_time: int = 0,
+                 index: str | None = None,
+                 max_payload_size: int = 0,
+                 enabled: bool = True,
+                 admission: FrequencyAdmission | None = None,
+                 key_tags: Callable[..., set[str]] | None = None):
         self._model_class = model_class
+        # Теги из параметров ключа: сущность, по которой строится выборка, может не попасть в сами значения
+        self._key_tags = key_tags
+        self._admission = admission
+        self._max_payload_size = max_payload_size
+        self._enabled = enabled
+        self._namespace = namespace or model_class.__name__
+        self._codec = codec or CacheCodec(model_class)
+        self._negative_cache_time = negative_cache_time
+        self._index = index
+        schema = orjson.dumps(model_class.model_json_schema(), option=orjson.OPT_SORT_KEYS)
+        self._schema_hash = hashlib.sha1(schema).hexdigest()[:8]
         self._storage = storage
+        self._local = local
+        self._refresh_ahead_ratio = refresh_ahead_ratio
+        self._refresh_ahead_hits = refresh_ahead_hits
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._hits: Counter[str] = Counter()
+        self._stats = cache_stats[self._namespace]
+
+    # Поколение меняется при изменении схемы модели или пересоздании индекса,
+    # после чего все старые ключи пространства имён просто перестают читаться
+    def _generation(self) -> str:
+        return '%s.%s' % (self._schema_hash, generations.get(self._index))
+
+    def _key(self, **kwargs) -> str:
+        params = orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS)
+        return '%s:%s:%s' % (self._namespace, self._generation(), hashlib.sha1(params).hexdigest())
+
+    def _decode(self, data: bytes):
+        return self._codec.decode(data)
+
+    def _encode(self, value) -> bytes:
+        return self._codec.encode(value)
+
+    def _tags(self, value, **kwargs) -> set[str]:
+        items = value if isinstance(value, list) else [value]
+        tags = self._key_tags(**kwargs) if self._key_tags is not None else set()
+        for item in items:
+            if hasattr(item, 'cache_tags'):
+                tags |= item.cache_tags()
+        return tags
+
+    def _track_hit(self, key: str) -> int:
+        if len(self._hits) >= HITS_TRACK_LIMIT and key not in self._hits:
+            self._hits.clear()
+        self._hits[key] += 1
+        return self._hits[key]
+
+    def _lookup_shared(self, key: str):
+        raw, ttl = shared_cache.shared_cache.get(key)
+        if raw is None:
+            return None
+        started = time.perf_counter()
+        data = self._decode(raw)
+        self._stats.decode_time += time.perf_counter() - started
+        if data is None:
+            return None
+        self._track_hit(key)
+        self._stats.shared_hits += 1
+        self._stats.read_bytes += len(raw)
+        if self._local is not None:
+            self._local.set(key, data, ttl=ttl)
+        return data
+
+    # Кладёт значение в кеши, которые стоят перед Redis: общий для воркеров и локальный
+    def _set_nearby(self, key: str, data, raw: bytes, ttl: float):
+        if shared_cache.shared_cache is not None:
+            shared_cache.shared_cache.set(key, raw, ttl)
+        if self._local is not None:
+            self._local.set(key, data, ttl=ttl)
+
+    # Возвращает значение и признак того, что его пора обновить в фоне
+    async def _lookup(self, key: str) -> tuple[Any, bool]:
+        if self._local is not None:
+            data = self._local.get(key)
+            if data is not None:
+                self._track_hit(key)
+                self._stats.local_hits += 1
+                return data, False
+
+        if shared_cache.shared_cache is not None:
+            data = self._lookup_shared(key)
+            if data is not None:
+                return data, False
+
+        raw, ttl = await self._storage.get_with_ttl(key)
+        if not raw:
+            self._stats.misses += 1
+            return None, False
+        started = time.perf_counter()
+        data = self._decode(raw)
+        self._stats.decode_time += time.perf_counter() - started
+        if data is None:
+            self._stats.misses += 1
+            return None, False
+        self._stats.read_bytes += len(raw)
+        hits = self._track_hit(key)
+
+        if data is MISSING:
+            self._stats.negative_hits += 1
+            self._set_nearby(key, data, raw, ttl)
+            return data, False
+
+        self._stats.redis_hits += 1
+        # Ключ без TTL считаем всегда свежим
+        if ttl < 0:
+            self._set_nearby(key, data, raw, self._storage.cache_time)
+            return data, False
+
+        fresh_for = ttl - self._storage.stale_time
+        if fresh_for <= 0:
+            self._stats.stale_hits += 1
+            return data, True
+        self._set_nearby(key, data, raw, fresh_for)
+
+        refresh_window = self._storage.cache_time * self._refresh_ahead_ratio
+        is_hot = 0 < self._refresh_ahead_hits <= hits
+        return data, is_hot and fresh_for <= refresh_window
 
     async def get(self, *args, **kwargs):
-        key = '%s:query:%s' % (self._model_class.__name__, str(kwargs))
-        data = await self._storage.get(key)
-        if not data:
+        if not self._enabled:
             return None
+        data, _ = await self._lookup(self._key(**kwargs))
+        if data is MISSING:
+            return None
+        return data
 
-        data = orjson.loads(data)
-        if isinstance(data, dict):
-            return self._model_class(**data)
-        elif isinstance(data, list):
-            data = [self._model_class.model_validate_json(obj) for obj in data]
-            return data
+    # Пакетное чтение без учёта устаревания: отсутствующие и негативные значения возвращаются как None
+    async def get_many(self, params: list[dict]) -> list:
+        if not self._enabled:
+            return [None] * len(params)
+        keys = [self._key(**kwargs) for kwargs in params]
+        values = [None] * len(keys)
+        remote = []
+        for position, key in enumerate(keys):
+            data = self._local.get(key) if self._local is not None else None
+            if data is not None:
+                self._stats.local_hits += 1
+            elif shared_cache.shared_cache is not None:
+                data = self._lookup_shared(key)
+            if data is None:
+                remote.append(position)
+            values[position] = data
+
+        raws = await self._storage.get_many([keys[position] for position in remote]) if remote else []
+        for position, raw in zip(remote, raws):
+            data = self._decode(raw) if raw else None
+            if data is None:
+                self._stats.misses += 1
+                continue
+            if data is MISSING:
+                self._stats.negative_hits += 1
+            else:
+                self._stats.redis_hits += 1
+            self._stats.read_bytes += len(raw)
+            if self._local is not None:
+                self._local.set(keys[position], data)
+            values[position] = data
+        return [None if value is MISSING else value for value in values]
 
     async def set(self, *args, **kwargs):
-        key = '%s:query:%s' % (self._model_class.__name__, str(kwargs))
-        if isinstance(args[0], list):
-            value = [obj.model_dump_json() for obj in args[0]]
-            value = orjson.dumps(value, default=None)
-        else:
-            value = json.dumps(args[0].dict())
-        await self._storage.set(key=key, value=value)
+        if not self._enabled:
+            return
+        key = self._key(**kwargs)
+        value = self._encode(args[0])
+        # Слишком большие значения не кешируем, чтобы не забивать Redis и сеть
+        if 0 < self._max_payload_size < len(value):
+            self._stats.oversized += 1
+            return
+        await self._storage.set(key=key, value=value, tags=self._tags(args[0], **kwargs))
+        self._stats.writes += 1
+        self._stats.written_bytes += len(value)
+        self._hits.pop(key, None)
+        self._set_nearby(key, args[0], value, self._storage.cache_time)
+
+    async def get_or_load(self, loader: Callable[[], Awaitable], **kwargs):
+        if not self._enabled:
+            await request_batch.flush()
+            return await loader()
+        key = self._key(**kwargs)
+        if self._admission is not None:
+            self._admission.record(key)
+        data, needs_refresh = await self._lookup(key)
+        if data is MISSING:
+            return None
+        if data:
+            # Устаревшее или горячее значение отдаём сразу, а обновляем в фоне
+            if needs_refresh:
+                self._start_load(key, loader, **kwargs)
+            return data
+
+        # Отложенный счётчик лимита проверяется в контексте своего запроса до похода в хранилище:
+        # превышение лимита одним клиентом не должно доставаться ожидающим того же ключа
+        await request_batch.flush()
+        # Одновременные промахи по одному ключу ждут один общий запрос в хранилище
+        return await asyncio.shield(self._start_load(key, loader, **kwargs))
+
+    def _start_load(self, key: str, loader: Callable[[], Awaitable], **kwargs) -> asyncio.Future:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(loader, **kwargs),
+                                                          context=request_batch.detached_context())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            task.add_done_callback(self._log_load_error)
+        return task
+
+    def _log_load_error(self, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            self._stats.load_errors += 1
+            logger.warning('Cache load failed: %r', task.exception())
+
+    async def set_missing(self, *args, **kwargs):
+        if not self._enabled or self._negative_cache_time <= 0:
+            return
+        key = self._key(**kwargs)
+        value = self._encode(MISSING)
+        await self._storage.set(key=key, value=value, ttl=self._negative_cache_time, tags=self._tags([], **kwargs))
+        self._set_nearby(key, MISSING, value, self._negative_cache_time)
+
+    async def _load(self, loader: Callable[[], Awaitable], **kwargs):
+        self._stats.loads += 1
+        data = await loader()
+        # Редкие ключи не вытесняют из кеша популярные
+        if self._admission is not None and not self._admission.admit(self._key(**kwargs)):
+            self._stats.not_admitted += 1
+            return data
+        if data:
+            await self.set(data, **kwargs)
+        elif data is None:
+            await self.set_missing(**kwargs)
+        return data
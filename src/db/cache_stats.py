@@ -0,0 +1,38 @@
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class CacheStats:
+    local_hits: int = 0
+    shared_hits: int = 0
+    redis_hits: int = 0
+    negative_hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    loads: int = 0
+    load_errors: int = 0
+    writes: int = 0
+    oversized: int = 0
+    not_admitted: int = 0
+    read_bytes: int = 0
+    written_bytes: int = 0
+    decode_time: float = 0.0
+
+    @property
+    def hits(self) -> int:
+        return self.local_hits + self.shared_hits + self.redis_hits + self.negative_hits
+
+    def summary(self) -> dict:
+        requests = self.hits + self.misses
+        decoded = self.shared_hits + self.redis_hits + self.negative_hits
+        return {
+            **asdict(self),
+            'hit_ratio': self.hits / requests if requests else 0.0,
+            'avg_decode_ms': self.decode_time * 1000 / decoded if decoded else 0.0,
+            'avg_payload_bytes': self.read_bytes / decoded if decoded else 0.0,
+        }
+
+
+# Счётчики ведутся в пределах процесса (воркера) и сбрасываются при его перезапуске
+cache_stats: defaultdict[str, CacheStats] = defaultdict(CacheStats)
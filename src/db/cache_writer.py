@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from typing import Iterable
+
+from db.redis import ShardedPipeline, ShardedRedis
+
+logger = logging.getLogger(__name__)
+
+# Теги хранятся в ZSET со сроком жизни записи в качестве score (раньше - SET с префиксом tag:)
+TAG_PREFIX = 'tags:'
+# Метка конца очереди: всё, что поставлено до неё, записывается до остановки
+STOP = object()
+
+
+def write_entry(pipe: ShardedPipeline, key: str, value: bytes, ttl: int, tags: Iterable[str], tag_time: int):
+    node_pipe = pipe.for_key(key)
+    if node_pipe is None:
+        return
+    node_pipe.set(key, value, ex=ttl)
+    # Множества тегов живут дольше любых записей, чтобы по ним всегда можно было найти зависимые ключи.
+    # Истёкшие записи вычищаются при каждой записи, иначе теги популярных сущностей растут бесконечно.
+    now = time.time()
+    for tag in tags:
+        tag_key = TAG_PREFIX + tag
+        tag_pipe = pipe.for_key(tag_key)
+        if tag_pipe is not None:
+            tag_pipe.zadd(tag_key, {key: now + ttl})
+            tag_pipe.zremrangebyscore(tag_key, '-inf', now)
+            tag_pipe.expire(tag_key, tag_time)
+
+
+class CacheWriter:
+    def __init__(self, redis: ShardedRedis, queue_size: int, batch_size: int):
+        self._redis = redis
+        self._batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, key: str, value: bytes, ttl: int, tags: Iterable[str], tag_time: int) -> bool:
+        # При переполненной очереди запись в кеш просто пропускается
+        try:
+            self._queue.put_nowait((key, value, ttl, tuple(tags), tag_time))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    async def _write(self, batch: list[tuple]):
+        pipe = self._redis.pipeline()
+        for entry in batch:
+            write_entry(pipe, *entry)
+        try:
+            written = await pipe.execute()
+        except Exception as exc:
+            written = False
+            logger.warning('Cache write-behind batch of %s entries failed: %r', len(batch), exc)
+        if written:
+            self.written += len(batch)
+        else:
+            self.dropped += len(batch)
+
+    def _drain(self, batch: list[tuple]):
+        while (len(batch) < self._batch_size and (not batch or batch[-1] is not STOP)
+               and not self._queue.empty()):
+            batch.append(self._queue.get_nowait())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if batch[-1] is STOP:
+                if len(batch) > 1:
+                    await self._write(batch[:-1])
+                return
+            await self._write(batch)
+
+    # Текущий пакет не прерывается: задача дописывает очередь до метки и завершается сама
+    async def close(self):
+        if self._task is not None:
+            await self._queue.put(STOP)
+            await self._task
+            self._task = None
+        while not self._queue.empty():
+            batch = []
+            self._drain(batch)
+            await self._write(batch)
+
+    def stats(self) -> dict:
+        return {'queued': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped}
+
+
+writer: CacheWriter | None = None
@@ -0,0 +1,58 @@
+import zlib
+from typing import Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+# Формат записи: [версия][флаги][тело]. Тело - JSON всего значения целиком,
+# при превышении порога сжатое zlib.
+CODEC_VERSION = 1
+FLAG_LIST = 0x01
+FLAG_ZLIB = 0x02
+FLAG_MISSING = 0x04
+
+# Маркер отсутствующего в хранилище объекта (негативное кеширование)
+MISSING = object()
+
+
+class CacheCodec:
+    def __init__(self,
+                 model_class: Type[BaseModel],
+                 compress_threshold: int = 0,
+                 compress_level: int = 1):
+        self._model_class = model_class
+        self._list_adapter = TypeAdapter(list[model_class])
+        self._compress_threshold = compress_threshold
+        self._compress_level = compress_level
+
+    def encode(self, value: BaseModel | list[BaseModel]) -> bytes:
+        if value is MISSING:
+            return bytes((CODEC_VERSION, FLAG_MISSING))
+
+        flags = 0
+        if isinstance(value, list):
+            flags |= FLAG_LIST
+            body = self._list_adapter.dump_json(value)
+        else:
+            body = value.__pydantic_serializer__.to_json(value)
+
+        if 0 < self._compress_threshold <= len(body):
+            flags |= FLAG_ZLIB
+            body = zlib.compress(body, self._compress_level)
+        return bytes((CODEC_VERSION, flags)) + body
+
+    def decode(self, data: bytes) -> BaseModel | list[BaseModel] | None:
+        # Записи другой версии формата считаем промахом - они будут перезаписаны
+        if len(data) < 2 or data[0] != CODEC_VERSION:
+            return None
+        flags = data[1]
+        if flags & FLAG_MISSING:
+            return MISSING
+        body = data[2:]
+        try:
+            if flags & FLAG_ZLIB:
+                body = zlib.decompress(body)
+            if flags & FLAG_LIST:
+                return self._list_adapter.validate_json(body)
+            return self._model_class.model_validate_json(body)
+        except (zlib.error, ValidationError):
+            return None
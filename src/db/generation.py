@@ -0,0 +1,51 @@
+import asyncio
+import hashlib
+import logging
+
+from elasticsearch import AsyncElasticsearch, NotFoundError, TransportError
+
+logger = logging.getLogger(__name__)
+
+INDICES = ('movies', 'genres', 'persons')
+UNKNOWN_GENERATION = '0'
+
+
+class IndexGenerations:
+    def __init__(self):
+        self._markers: dict[str, str] = {}
+
+    def get(self, index: str | None) -> str:
+        if index is None:
+            return UNKNOWN_GENERATION
+        return self._markers.get(index, UNKNOWN_GENERATION)
+
+    def current(self) -> str:
+        return '.'.join(self.get(index) for index in INDICES)
+
+    async def _fetch(self, elastic: AsyncElasticsearch, index: str) -> str:
+        try:
+            response = await elastic.indices.get_settings(index=index, name='index.uuid')
+        except NotFoundError:
+            return UNKNOWN_GENERATION
+        # Для алиаса в ответе окажутся реальные индексы, на которые он указывает
+        uuids = sorted(item['settings']['index']['uuid'] for item in response.values())
+        return hashlib.sha1(','.join(uuids).encode()).hexdigest()[:8]
+
+    async def refresh(self, elastic: AsyncElasticsearch):
+        try:
+            markers = await asyncio.gather(*(self._fetch(elastic, index) for index in INDICES))
+        except TransportError as exc:
+            logger.warning('Index generation refresh failed: %r', exc)
+            return
+        for index, marker in zip(INDICES, markers):
+            if self._markers.get(index, marker) != marker:
+                logger.info('Index %s changed generation to %s', index, marker)
+            self._markers[index] = marker
+
+    async def poll(self, elastic: AsyncElasticsearch, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh(elastic)
+
+
+generations = IndexGenerations()
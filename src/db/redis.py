@@ -1,8 +1,119 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+VIRTUAL_NODES = 160
+NODE_ERRORS = (ConnectionError, TimeoutError, OSError)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+# Кеш раскладывается по нескольким Redis через консистентное хеширование.
+# Недоступный узел временно исключается, а его ключи считаются промахом.
+class ShardedRedis:
+    def __init__(self, nodes: dict[str, Redis], retry_interval: float = 5):
+        self._nodes = nodes
+        self._retry_interval = retry_interval
+        self._down_until: dict[str, float] = {}
+        self._ring: list[tuple[int, str]] = sorted(
+            (_hash('%s#%s' % (name, replica)), name)
+            for name in nodes
+            for replica in range(VIRTUAL_NODES)
+        )
+        self._ring_hashes = [point for point, _ in self._ring]
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[tuple[str, int]], socket_timeout: float, retry_interval: float):
+        clients = {
+            '%s:%s' % (host, port): Redis(host=host, port=port,
+                                          socket_timeout=socket_timeout,
+                                          socket_connect_timeout=socket_timeout)
+            for host, port in nodes
+        }
+        return cls(clients, retry_interval)
+
+    @property
+    def nodes(self) -> dict[str, Redis]:
+        return self._nodes
+
+    def node_name(self, key: str) -> str:
+        index = bisect.bisect(self._ring_hashes, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+    def is_up(self, name: str) -> bool:
+        return self._down_until.get(name, 0) <= time.monotonic()
+
+    def node(self, key: str) -> Redis | None:
+        name = self.node_name(key)
+        return self._nodes[name] if self.is_up(name) else None
+
+    def mark_down(self, name: str, exc: Exception):
+        if self.is_up(name):
+            logger.warning('Redis node %s is unavailable: %r', name, exc)
+        self._down_until[name] = time.monotonic() + self._retry_interval
+
+    async def call_node(self, name: str, operation: Callable[[Redis], Awaitable], default: Any = None):
+        if not self.is_up(name):
+            return default
+        try:
+            return await operation(self._nodes[name])
+        except NODE_ERRORS as exc:
+            self.mark_down(name, exc)
+            return default
+
+    async def call(self, key: str, operation: Callable[[Redis], Awaitable], default: Any = None):
+        return await self.call_node(self.node_name(key), operation, default)
+
+    def group(self, keys: Iterable[str]) -> dict[str, list[str]]:
+        groups: dict[str, list[str]] = {}
+        for key in keys:
+            groups.setdefault(self.node_name(key), []).append(key)
+        return groups
+
+    def pipeline(self) -> 'ShardedPipeline':
+        return ShardedPipeline(self)
+
+    async def close(self):
+        await asyncio.gather(*(node.close() for node in self._nodes.values()))
+
+
+class ShardedPipeline:
+    def __init__(self, redis: ShardedRedis):
+        self._redis = redis
+        self._pipes: dict[str, Pipeline] = {}
+
+    def for_key(self, key: str) -> Pipeline | None:
+        name = self._redis.node_name(key)
+        if not self._redis.is_up(name):
+            return None
+        pipe = self._pipes.get(name)
+        if pipe is None:
+            pipe = self._pipes[name] = self._redis.nodes[name].pipeline(transaction=False)
+        return pipe
+
+    async def execute(self) -> bool:
+        results = await asyncio.gather(*(
+            self._redis.call_node(name, lambda _, pipe=pipe: pipe.execute(), default=False)
+            for name, pipe in self._pipes.items()
+        ))
+        self._pipes.clear()
+        return all(result is not False for result in results)
+
 
-redis: Redis | None = None
+redis: ShardedRedis | None = None
 
 
 # Функция понадобится при внедрении зависимостей
-async def get_redis() -> Redis:
+async def get_redis() -> ShardedRedis:
     return redis
@@ -0,0 +1,98 @@
+import asyncio
+from contextvars import Context, ContextVar, copy_context
+from typing import Any, Callable
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+
+# Команды, отложенные до первого обращения запроса к Redis: они уходят в одном пайплайне
+# с чтением кеша, а если запрос обошёлся без Redis - отправляются отдельно
+class RequestBatch:
+    def __init__(self):
+        self._pending: list[tuple[Redis, Callable[[Pipeline], Any], Callable[[Any], None], asyncio.Future]] = []
+
+    def defer(self,
+              node: Redis,
+              queue: Callable[[Pipeline], Any],
+              check: Callable[[Any], None]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((node, queue, check, future))
+        return future
+
+    def attach(self, node: Redis, pipe: Pipeline) -> list[tuple[Callable[[Any], None], asyncio.Future]]:
+        attached = []
+        for item in list(self._pending):
+            item_node, queue, check, future = item
+            if item_node is node:
+                queue(pipe)
+                attached.append((check, future))
+                self._pending.remove(item)
+        return attached
+
+    @staticmethod
+    def fail(attached: list, exc: Exception):
+        for _, future in attached:
+            future.set_exception(exc)
+
+    # Проверки выполняются после разбора всех результатов и могут прервать запрос исключением
+    @staticmethod
+    def resolve(attached: list, results: list):
+        for (_, future), result in zip(attached, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        for check, future in attached:
+            if future.exception() is None:
+                check(future.result())
+
+    async def flush(self):
+        pending, self._pending = self._pending, []
+        for node, queue, check, future in pending:
+            attached = [(check, future)]
+            try:
+                async with node.pipeline(transaction=False) as pipe:
+                    queue(pipe)
+                    results = await pipe.execute(raise_on_error=False)
+            except Exception as exc:
+                self.fail(attached, exc)
+                continue
+            self.resolve(attached, results)
+
+
+current_batch: ContextVar[RequestBatch | None] = ContextVar('request_batch', default=None)
+
+
+async def execute(node: Redis, queue: Callable[[Pipeline], Any]) -> list:
+    batch = current_batch.get()
+    async with node.pipeline(transaction=False) as pipe:
+        attached = batch.attach(node, pipe) if batch is not None else []
+        queue(pipe)
+        try:
+            results = await pipe.execute(raise_on_error=not attached)
+        except Exception as exc:
+            RequestBatch.fail(attached, exc)
+            raise
+    if not attached:
+        return results
+    batch.resolve(attached, results[:len(attached)])
+    results = results[len(attached):]
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+
+# Контекст без пакета запроса: для общих задач, результат которых получают несколько запросов
+def detached_context() -> Context:
+    context = copy_context()
+    context.run(current_batch.set, None)
+    return context
+
+
+# Перед обращением к хранилищу отложенные команды нужно выполнить, не дожидаясь чтения кеша
+async def flush():
+    batch = current_batch.get()
+    if batch is not None:
+        await batch.flush()
@@ -0,0 +1,156 @@
+import fcntl
+import hashlib
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+# Сегмент: [заголовок][слоты...], слот - [seq][хеш ключа][срок жизни][длина][данные].
+# Читатели не берут блокировку: нечётный или изменившийся seq означает, что слот
+# в этот момент перезаписывается, и чтение повторяется (seqlock).
+MAGIC = b'SHC1'
+HEADER = struct.Struct('<4sII')
+SEQ = struct.Struct('<I')
+SLOT = struct.Struct('<I16sdI')
+SLOT_BODY = struct.Struct('<16sdI')
+EMPTY_DIGEST = bytes(16)
+PROBE_LENGTH = 4
+READ_RETRIES = 3
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+class SharedCache:
+    def __init__(self, memory: SharedMemory, lock_file: int, slots: int, slot_size: int, ttl: float = 0):
+        self._memory = memory
+        self._buffer = memory.buf
+        self._lock_file = lock_file
+        self._slots = slots
+        self._slot_size = slot_size
+        self._capacity = slot_size - SLOT.size
+        # Запись из общего сегмента не удалить точечно на всех хостах, поэтому она живёт не дольше ttl
+        self._ttl = ttl
+
+    @classmethod
+    def open(cls, name: str, slots: int, slot_size: int, ttl: float = 0) -> 'SharedCache':
+        # Размеры входят в имя, чтобы воркеры с другой конфигурацией не делили один сегмент
+        name = '%s_%sx%s' % (name, slots, slot_size)
+        lock_file = os.open(os.path.join(tempfile.gettempdir(), name + '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            memory = cls._attach(name, slots, slot_size)
+        except Exception:
+            os.close(lock_file)
+            raise
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return cls(memory, lock_file, slots, slot_size, ttl)
+
+    @staticmethod
+    def _attach(name: str, slots: int, slot_size: int) -> SharedMemory:
+        size = HEADER.size + slots * slot_size
+        try:
+            memory = SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            memory = SharedMemory(name=name)
+        # Сегмент общий для всех воркеров: завершение одного из них не должно его удалять
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        magic, stored_slots, stored_slot_size = HEADER.unpack_from(memory.buf, 0)
+        if magic == bytes(len(MAGIC)):
+            HEADER.pack_into(memory.buf, 0, MAGIC, slots, slot_size)
+        elif (magic, stored_slots, stored_slot_size) != (MAGIC, slots, slot_size) or memory.size < size:
+            memory.close()
+            raise ValueError('Shared cache segment %s has another layout' % name)
+        return memory
+
+    @contextmanager
+    def _locked(self, blocking: bool):
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._lock_file, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _offsets(self, digest: bytes):
+        start = int.from_bytes(digest[:8], 'little') % self._slots
+        for step in range(PROBE_LENGTH):
+            yield HEADER.size + (start + step) % self._slots * self._slot_size
+
+    def _read(self, offset: int, digest: bytes) -> tuple[bytes | None, float] | None:
+        for _ in range(READ_RETRIES):
+            seq, slot_digest, expires_at, size = SLOT.unpack_from(self._buffer, offset)
+            if seq & 1:
+                continue
+            if slot_digest != digest:
+                return None
+            start = offset + SLOT.size
+            payload = bytes(self._buffer[start:start + min(size, self._capacity)])
+            if SEQ.unpack_from(self._buffer, offset)[0] != seq:
+                continue
+            return payload, expires_at - time.time()
+        return None
+
+    def get(self, key: str) -> tuple[bytes | None, float]:
+        digest = _digest(key)
+        for offset in self._offsets(digest):
+            item = self._read(offset, digest)
+            if item is not None:
+                payload, ttl = item
+                return (payload, ttl) if ttl > 0 else (None, 0)
+        return None, 0
+
+    def _write(self, offset: int, digest: bytes, expires_at: float, value: bytes):
+        seq = SEQ.unpack_from(self._buffer, offset)[0]
+        SEQ.pack_into(self._buffer, offset, (seq + 1) & 0xFFFFFFFF)
+        SLOT_BODY.pack_into(self._buffer, offset + SEQ.size, digest, expires_at, len(value))
+        start = offset + SLOT.size
+        self._buffer[start:start + len(value)] = value
+        SEQ.pack_into(self._buffer, offset, (seq + 2) & 0xFFFFFFFF)
+
+    # Слот с тем же ключом, иначе пустой или тот, что истекает раньше остальных
+    def _choose_slot(self, digest: bytes) -> int:
+        victim, victim_expires_at = None, None
+        for offset in self._offsets(digest):
+            _, slot_digest, expires_at, _ = SLOT.unpack_from(self._buffer, offset)
+            if slot_digest == digest:
+                return offset
+            if victim is None or expires_at < victim_expires_at:
+                victim, victim_expires_at = offset, expires_at
+        return victim
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        if self._ttl > 0:
+            ttl = min(ttl, self._ttl)
+        if ttl <= 0 or len(value) > self._capacity:
+            return False
+        digest = _digest(key)
+        # Запись в общий кеш необязательна: если слот занят другим воркером, просто пропускаем
+        with self._locked(blocking=False) as locked:
+            if not locked:
+                return False
+            self._write(self._choose_slot(digest), digest, time.time() + ttl, value)
+        return True
+
+    def delete(self, key: str):
+        digest = _digest(key)
+        with self._locked(blocking=True):
+            for offset in self._offsets(digest):
+                if SLOT.unpack_from(self._buffer, offset)[1] == digest:
+                    self._write(offset, EMPTY_DIGEST, 0, b'')
+
+    def close(self):
+        self._buffer = None
+        self._memory.close()
+        os.close(self._lock_file)
+
+
+shared_cache: SharedCache | None = None
@@ -0,0 +1,111 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Формат файла: [заголовок][поколение][записи...],
+# запись - [срок жизни][длина ключа][длина значения][ключ][значение].
+# Срок жизни хранится в абсолютном времени, так как monotonic у нового процесса свой.
+MAGIC = b'LCS1'
+HEADER = struct.Struct('<4sHI')
+ENTRY = struct.Struct('<dHI')
+
+
+class CacheSnapshot:
+    def __init__(self, file, data: mmap.mmap, index: dict[str, tuple[float, int, int]]):
+        self._file = file
+        self._data = data
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @classmethod
+    def load(cls, path: str, generation: str) -> 'CacheSnapshot | None':
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            file.close()
+            return None
+
+        index = {}
+        try:
+            magic, generation_size, count = HEADER.unpack_from(data, 0)
+            offset = HEADER.size + generation_size
+            if magic != MAGIC or data[HEADER.size:offset].decode() != generation:
+                count = 0
+            # Читаются только ключи, значения декодируются при первом обращении
+            for _ in range(count):
+                expires_at, key_size, value_size = ENTRY.unpack_from(data, offset)
+                offset += ENTRY.size
+                key = data[offset:offset + key_size].decode()
+                offset += key_size
+                index[key] = (expires_at, offset, value_size)
+                offset += value_size
+        except (struct.error, UnicodeDecodeError) as exc:
+            logger.warning('Local cache snapshot %s is broken: %r', path, exc)
+            index = {}
+
+        if not index:
+            data.close()
+            file.close()
+            return None
+        logger.info('Local cache snapshot loaded: %s entries', len(index))
+        return cls(file, data, index)
+
+    # Запись отдаётся один раз: дальше значение живёт в локальном кеше
+    def pop(self, key: str) -> tuple[bytes | None, float]:
+        item = self._index.pop(key, None)
+        if item is None:
+            return None, 0
+        expires_at, offset, size = item
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return None, 0
+        return self._data[offset:offset + size], ttl
+
+    def entries(self) -> Iterator[tuple[str, float, bytes]]:
+        now = time.time()
+        for key, (expires_at, offset, size) in list(self._index.items()):
+            if expires_at > now:
+                yield key, expires_at - now, self._data[offset:offset + size]
+
+    def discard(self, key: str):
+        self._index.pop(key, None)
+
+    def close(self):
+        self._index.clear()
+        self._data.close()
+        self._file.close()
+
+
+def save_snapshot(path: str, generation: str, entries: Iterable[tuple[str, float, bytes]]) -> int:
+    now = time.time()
+    generation = generation.encode()
+    count = 0
+    # Пишем во временный файл и атомарно подменяем: отображённый в память старый файл остаётся валидным
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(generation), 0))
+        file.write(generation)
+        for key, ttl, value in entries:
+            key = key.encode()
+            file.write(ENTRY.pack(now + ttl, len(key), len(value)))
+            file.write(key)
+            file.write(value)
+            count += 1
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, len(generation), count))
+    os.replace(tmp_path, path)
+    return count
+
+
+snapshot: CacheSnapshot | None = None
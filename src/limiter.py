@@ -1,33 +1,317 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from dataclasses import dataclass
+from functools import partial
 from http import HTTPStatus
 
+from async_fastapi_jwt_auth import AuthJWT
+from async_fastapi_jwt_auth.exceptions import AuthJWTException
 from fastapi import Request, HTTPException
-from redis import Redis
-from functools import wraps
+from fastapi.responses import ORJSONResponse
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript
+from redis.exceptions import NoScriptError, RedisError
+from starlette.routing import Match
+
 from core.config import settings
+from db import request_batch
+from db.request_batch import RequestBatch
+from services.auth import CheckAuth
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS_TIER = 'anonymous'
+USER_TIER = 'user'
+
+# GCRA: в ключе хранится теоретическое время прихода следующего запроса (TAT).
+# Запрос пропускается, если TAT не убегает от текущего времени дальше, чем на интервал лимита.
+# Проверка и обновление выполняются атомарно на стороне Redis за одно обращение.
+GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + emission * cost
+local allow_at = new_tat - tolerance
+if allow_at > now then
+    -- Уже обслуженные запросы (синхронизация локальных лимитов) учитываются даже сверх лимита
+    if ARGV[4] == '1' then
+        redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+        return {0, 0, allow_at - now, new_tat - now}
+    end
+    return {0, 0, allow_at - now, tat - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, math.floor((now - allow_at) / emission), 0, new_tat - now}
+"""
+GCRA_SHA = hashlib.sha1(GCRA_SCRIPT.encode()).hexdigest()
+
+# Счётчики лимитов можно вынести на отдельный от кеша Redis
+redis: Redis | None = None
+# Скрипт регистрируется один раз вместе с клиентом, а не хешируется на каждый запрос
+gcra: AsyncScript | None = None
+# Включается, если redis - клиент одного из узлов кеша
+batching = False
+
+
+@dataclass
+class RateLimitState:
+    limit: int
+    remaining: int
+    reset: float
+    retry_after: float = 0
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(math.ceil(self.reset)),
+        }
+        if self.retry_after:
+            headers['Retry-After'] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, state: RateLimitState):
+        self.state = state
+
+
+def _gcra_args(limit: int, interval: int, cost: int, force: bool = False) -> list[int]:
+    return [max(round(interval * 1000 / limit), 1), interval * 1000, cost, int(force)]
+
+
+def _gcra(key: str, limit: int, interval: int, cost: int, force: bool = False, client=None):
+    # Скрипт вызывается через EVALSHA, текст отправляется только если Redis его ещё не знает
+    return gcra(keys=[key], args=_gcra_args(limit, interval, cost, force), client=client)
+
+
+# В пакете запроса скрипт вызывается только по хешу: загрузка скрипта стоила бы лишнего обращения
+def _queue_gcra(key: str, limit: int, interval: int, cost: int, pipe: Pipeline):
+    pipe.evalsha(GCRA_SHA, 1, key, *_gcra_args(limit, interval, cost))
+
+
+def _state(limit: int, result: list) -> tuple[bool, RateLimitState]:
+    allowed, remaining, retry_after, reset = result
+    state = RateLimitState(limit=limit, remaining=remaining, reset=reset / 1000, retry_after=retry_after / 1000)
+    return bool(allowed), state
+
+
+async def hit(key: str, limit: int, interval: int, cost: int = 1) -> tuple[bool, RateLimitState]:
+    return _state(limit, await _gcra(key, limit, interval, cost))
+
+
+def _check(limit: int, result: list):
+    allowed, state = _state(limit, result)
+    if not allowed:
+        raise RateLimitExceeded(state)
 
 
-redis = Redis(host=settings.redis.host, port=settings.redis.port)
+@dataclass
+class TokenBucket:
+    limit: int
+    interval: int
+    tokens: float
+    updated_at: float
+    pending: int = 0
 
+    def refill(self, now: float):
+        self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * self.limit / self.interval)
+        self.updated_at = now
 
-def rate_limit(limit=settings.rate_limit.limit, interval=settings.rate_limit.interval):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(request: Request, *args, **kwargs):
-            ip_address = request.client.host
-            key = f"rate_limit:{ip_address}"
 
-            current_count = redis.get(key)
-            if current_count is None:
-                redis.setex(key, interval, 1)
+# Гибридный режим: решение принимается по локальным корзинам токенов без обращения к сети,
+# а израсходованные токены пачкой досылаются в Redis, откуда приходит общий для всех воркеров остаток.
+# Клиент, превысивший общий лимит, попадает в локальный штрафной список и отсекается сразу.
+class LocalLimiter:
+    def __init__(self, sync_interval: float, penalty_time: float):
+        self._sync_interval = sync_interval
+        self._penalty_time = penalty_time
+        self._buckets: dict[str, TokenBucket] = {}
+        self._penalties: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+
+    def hit(self, key: str, limit: int, interval: int, cost: int = 1) -> tuple[bool, RateLimitState]:
+        now = time.monotonic()
+        penalty_until = self._penalties.get(key)
+        if penalty_until is not None:
+            if penalty_until > now:
+                wait = penalty_until - now
+                return False, RateLimitState(limit=limit, remaining=0, reset=wait, retry_after=wait)
+            del self._penalties[key]
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(limit, interval, limit, now)
+        bucket.refill(now)
+        if bucket.tokens < cost:
+            wait = (cost - bucket.tokens) * interval / limit
+            return False, RateLimitState(limit=limit, remaining=0, reset=interval, retry_after=wait)
+        bucket.tokens -= cost
+        bucket.pending += cost
+        reset = (limit - bucket.tokens) * interval / limit
+        return True, RateLimitState(limit=limit, remaining=int(bucket.tokens), reset=reset)
+
+    async def sync(self):
+        now = time.monotonic()
+        batch = []
+        for key, bucket in list(self._buckets.items()):
+            if bucket.pending:
+                batch.append((key, bucket, bucket.pending))
+                bucket.pending = 0
+            elif now - bucket.updated_at > bucket.interval:
+                # Простаивающая корзина уже полна, хранить её незачем
+                del self._buckets[key]
+        if not batch:
+            return
+
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key, bucket, cost in batch:
+                    await _gcra(key, bucket.limit, bucket.interval, cost, force=True, client=pipe)
+                results = await pipe.execute()
+        except RedisError as exc:
+            logger.warning('Rate limit sync failed: %r', exc)
+            self._requeue(batch)
+            return
+        except asyncio.CancelledError:
+            # Прерванная пачка досылается при следующей синхронизации
+            self._requeue(batch)
+            raise
+
+        now = time.monotonic()
+        for (key, bucket, _), result in zip(batch, results):
+            allowed, state = _state(bucket.limit, result)
+            if allowed:
+                bucket.tokens = min(bucket.tokens, state.remaining)
             else:
-                current_count = int(current_count) + 1
-                redis.setex(key, interval, current_count)
+                bucket.tokens = 0
+                self._penalties[key] = now + max(state.retry_after, self._penalty_time)
+        for key, until in list(self._penalties.items()):
+            if until <= now:
+                del self._penalties[key]
+
+    @staticmethod
+    def _requeue(batch: list[tuple[str, TokenBucket, int]]):
+        for _, bucket, cost in batch:
+            bucket.pending += cost
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._sync_interval)
+            await self.sync()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sync()
+
+
+local_limiter: LocalLimiter | None = None
+
+
+def _route_path(request: Request) -> str | None:
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return None
+
+
+# Квота выбирается по пользователю из JWT и его роли, анонимные запросы считаются по IP
+async def _principal(request: Request) -> tuple[str, str]:
+    try:
+        user = await CheckAuth(AuthJWT(req=request)).check_authorization(request)
+    except (HTTPException, AuthJWTException):
+        user = None
+    if user is None or user.user_id is None:
+        return f"rate_limit:ip:{request.client.host}", ANONYMOUS_TIER
+    tier = settings.rate_limit.role_tiers.get(str(user.role_id), USER_TIER)
+    return f"rate_limit:user:{user.user_id}", tier
+
+
+def _too_many_requests(state: RateLimitState) -> ORJSONResponse:
+    return ORJSONResponse({'detail': 'Too many requests'},
+                          status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                          headers=state.headers())
+
+
+# Счётчик откладывается до первого чтения кеша на том же узле и уходит с ним одним пайплайном.
+# Превышение лимита прерывает обработку исключением; если запрос обошёлся без Redis
+# или дошёл до хранилища, счётчик отправляется отдельно.
+async def _batched_call(request: Request, call_next, key: str, limit: int, interval: int, cost: int):
+    batch = RequestBatch()
+    result = batch.defer(redis, partial(_queue_gcra, key, limit, interval, cost), partial(_check, limit))
+    token = request_batch.current_batch.set(batch)
+    try:
+        response = await call_next(request)
+        await batch.flush()
+    except RateLimitExceeded as exc:
+        return _too_many_requests(exc.state)
+    finally:
+        request_batch.current_batch.reset(token)
+
+    exc = result.exception()
+    try:
+        if isinstance(exc, NoScriptError):
+            # Redis ещё не знает скрипт: обычный вызов загрузит его для следующих запросов
+            allowed, state = await hit(key, limit, interval, cost)
+        elif exc is not None:
+            raise exc
+        else:
+            allowed, state = _state(limit, result.result())
+    except RedisError as exc:
+        logger.warning('Rate limit check failed: %r', exc)
+        return response
+
+    # Исключение могло быть перехвачено по пути, решение всё равно за лимитом
+    if not allowed:
+        return _too_many_requests(state)
+    response.headers.update(state.headers())
+    return response
 
-                if current_count > limit:
-                    raise HTTPException(status_code=HTTPStatus.TOO_MANY_REQUESTS, detail="Too many requests")
 
-            return await func(request, *args, **kwargs)
+async def rate_limit_middleware(request: Request, call_next):
+    path = _route_path(request)
+    cost = settings.rate_limit.route_costs.get(path, 1)
+    if cost <= 0:
+        return await call_next(request)
+    key, tier = await _principal(request)
+    limit, interval = settings.rate_limit.tier_limits(tier)
+    # Откладывать счётчик имеет смысл только там, где первым делом читается кеш:
+    # остальные маршруты (администрирование кеша, запись) не должны выполняться до решения по лимиту
+    if batching and local_limiter is None and path in settings.rate_limit.batched_routes:
+        return await _batched_call(request, call_next, key, limit, interval, cost)
 
-        return wrapper
+    try:
+        if local_limiter is not None:
+            allowed, state = local_limiter.hit(key, limit, interval, cost)
+        else:
+            allowed, state = await hit(key, limit, interval, cost)
+    except RedisError as exc:
+        # Недоступность Redis не должна останавливать API
+        logger.warning('Rate limit check failed: %r', exc)
+        return await call_next(request)
 
-    return decorator
+    if not allowed:
+        return _too_many_requests(state)
+    response = await call_next(request)
+    response.headers.update(state.headers())
+    return response
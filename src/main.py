@@ -1,3 +1,6 @@
+import asyncio
+import logging
+
 import uvicorn
 
 from contextlib import asynccontextmanager
@@ -8,20 +11,84 @@ from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 from redis.asyncio import Redis
 
-from api.v1 import films, persons, genres
+from api.v1 import cache, films, persons, genres
+from api.v1.pagination import invalid_cursor_handler
 from core.config import settings, JWTSettings
 from core.logger import LOGGING
+from db import cache_writer
 from db import elastic
 from db import redis
+from db import shared_cache
+from db import snapshot
+from db.cache import save_local_caches
+from db.cache_writer import CacheWriter
+from db.redis import ShardedRedis
+from db.shared_cache import SharedCache
+from db.generation import generations
+from db.snapshot import CacheSnapshot
+import limiter
+from limiter import LocalLimiter, rate_limit_middleware
+from models.utils import InvalidCursorError
+from services.warmup import warm_up_cache
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis.redis = Redis(host=settings.redis.host, port=settings.redis.port)
+    redis.redis = ShardedRedis.from_nodes(settings.redis.cache_node_list(),
+                                          settings.redis.socket_timeout,
+                                          settings.redis.node_retry_interval)
     elastic.es = AsyncElasticsearch(hosts=settings.elasticsearch.url())
+    limiter_host = settings.rate_limit.redis_host or settings.redis.host
+    limiter_port = settings.rate_limit.redis_port or settings.redis.port
+    # Счётчики на одном из узлов кеша идут через тот же клиент, чтобы их можно было пакетировать с чтениями
+    limiter.redis = redis.redis.nodes.get('%s:%s' % (limiter_host, limiter_port))
+    limiter.batching = settings.rate_limit.batching and limiter.redis is not None
+    if limiter.redis is None:
+        limiter.redis = Redis(host=limiter_host, port=limiter_port)
+    limiter.gcra = limiter.redis.register_script(limiter.GCRA_SCRIPT)
+    if settings.rate_limit.mode == 'hybrid':
+        limiter.local_limiter = LocalLimiter(settings.rate_limit.sync_interval, settings.rate_limit.penalty_time)
+        limiter.local_limiter.start()
+    if settings.shared_cache.enabled:
+        try:
+            shared_cache.shared_cache = SharedCache.open(settings.shared_cache.name,
+                                                         settings.shared_cache.slots,
+                                                         settings.shared_cache.slot_size,
+                                                         settings.shared_cache.ttl)
+        except (OSError, ValueError) as exc:
+            logger.warning('Shared cache is disabled: %r', exc)
+    if settings.cache_writer.enabled:
+        cache_writer.writer = CacheWriter(redis.redis,
+                                          settings.cache_writer.queue_size,
+                                          settings.cache_writer.batch_size)
+        cache_writer.writer.start()
+    await generations.refresh(elastic.es)
+    if settings.local_cache.snapshot_path:
+        snapshot.snapshot = CacheSnapshot.load(settings.local_cache.snapshot_path, generations.current())
+    generations_poll = asyncio.create_task(
+        generations.poll(elastic.es, settings.cache_generation_poll_interval)
+    )
+    await warm_up_cache(redis.redis, elastic.es)
     yield
 
+    generations_poll.cancel()
+    if settings.local_cache.snapshot_path:
+        save_local_caches(settings.local_cache.snapshot_path, generations.current())
+    if snapshot.snapshot is not None:
+        snapshot.snapshot.close()
+        snapshot.snapshot = None
+    if cache_writer.writer is not None:
+        await cache_writer.writer.close()
+    if shared_cache.shared_cache is not None:
+        shared_cache.shared_cache.close()
+        shared_cache.shared_cache = None
+    if limiter.local_limiter is not None:
+        await limiter.local_limiter.close()
     await redis.redis.close()
+    if limiter.redis not in redis.redis.nodes.values():
+        await limiter.redis.close()
     await elastic.es.close()
 
 app = FastAPI(
@@ -35,9 +102,13 @@ app = FastAPI(
 )
 
 
+app.middleware('http')(rate_limit_middleware)
+app.add_exception_handler(InvalidCursorError, invalid_cursor_handler)
+
 app.include_router(films.router, prefix='/api/v1/films', tags=['films'])
 app.include_router(persons.router, prefix='/api/v1/persons', tags=['persons'])
 app.include_router(genres.router, prefix='/api/v1/genres', tags=['genres'])
+app.include_router(cache.router, prefix='/api/v1/cache', tags=['cache'])
 
 
 @AuthJWT.load_config
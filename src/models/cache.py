@@ -0,0 +1,67 @@
+from models.utils import BaseOrjsonModel
+
+
+class CacheInvalidation(BaseOrjsonModel):
+    films: list[str] = []
+    genres: list[str] = []
+    persons: list[str] = []
+
+    def tags(self) -> set[str]:
+        tags = {'film:%s' % film_id for film_id in self.films}
+        tags.update('genre:%s' % genre_id for genre_id in self.genres)
+        tags.update('person:%s' % person_id for person_id in self.persons)
+        return tags
+
+
+class CacheInvalidationResult(BaseOrjsonModel):
+    deleted: int
+
+
+class CacheNamespaceStats(BaseOrjsonModel):
+    local_hits: int
+    shared_hits: int
+    redis_hits: int
+    negative_hits: int
+    stale_hits: int
+    misses: int
+    loads: int
+    load_errors: int
+    writes: int
+    oversized: int
+    not_admitted: int
+    read_bytes: int
+    written_bytes: int
+    decode_time: float
+    hit_ratio: float
+    avg_decode_ms: float
+    avg_payload_bytes: float
+
+
+class KeyspaceKey(BaseOrjsonModel):
+    key: str
+    bytes: int
+
+
+class KeyspaceNamespace(BaseOrjsonModel):
+    keys: int
+    bytes: int
+    ttl: dict[str, int]
+    largest: list[KeyspaceKey]
+
+
+class Keyspace(BaseOrjsonModel):
+    total_keys: int
+    sampled_keys: int
+    namespaces: dict[str, KeyspaceNamespace]
+
+
+class CacheWriterStats(BaseOrjsonModel):
+    queued: int
+    written: int
+    dropped: int
+
+
+class CacheStatsOut(BaseOrjsonModel):
+    namespaces: dict[str, CacheNamespaceStats]
+    keyspace: Keyspace
+    writer: CacheWriterStats | None = None
@@ -13,6 +13,13 @@ class Film(BaseOrjsonModel):
     writers: list[RolePerson] | None
     directors: list[RolePerson] | None
 
+    def cache_tags(self) -> set[str]:
+        tags = {'film:%s' % self.id}
+        tags.update('genre:%s' % genre.id for genre in self.genres_list or [])
+        for persons in (self.actors, self.writers, self.directors):
+            tags.update('person:%s' % person.id for person in persons or [])
+        return tags
+
 
 class MainFilmInformation(BaseOrjsonModel):
     id: str
@@ -20,6 +27,20 @@ class MainFilmInformation(BaseOrjsonModel):
     imdb_rating: float | None
     genres_list: list[Genre] | None
 
+    def cache_tags(self) -> set[str]:
+        tags = {'film:%s' % self.id}
+        tags.update('genre:%s' % genre.id for genre in self.genres_list or [])
+        return tags
+
+    @classmethod
+    def from_film(cls, film: Film):
+        return cls(
+            id=film.id,
+            title=film.title,
+            imdb_rating=film.imdb_rating,
+            genres_list=film.genres_list,
+        )
+
 
 class FilmOut(BaseOrjsonModel):
     id: str
@@ -4,3 +4,6 @@ from models.utils import BaseOrjsonModel
 class Genre(BaseOrjsonModel):
     id: str
     name: str
+
+    def cache_tags(self) -> set[str]:
+        return {'genre:%s' % self.id}
@@ -11,6 +11,11 @@ class Person(BaseOrjsonModel):
     full_name: str
     films: list[PersonFilm | None] | None
 
+    def cache_tags(self) -> set[str]:
+        tags = {'person:%s' % self.id}
+        tags.update('film:%s' % film.id for film in self.films or [] if film and film.id)
+        return tags
+
 
 class RolePerson(BaseOrjsonModel):
     id: str
@@ -1,6 +1,9 @@
+import base64
+import binascii
+
 import orjson
-from pydantic import BaseModel
-from typing import List, TypeVar, Generic
+from pydantic import BaseModel, Field
+from typing import List, TypeVar, Generic, Union
 
 
 T = TypeVar('T')
@@ -20,3 +23,44 @@ class PaginatedResults(BaseOrjsonModel, Generic[T]):
     results: List[T]
     page_size: int
     page: int
+    next_cursor: str | None = None
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+# Непрозрачный для клиента курсор: значения сортировки последнего документа для search_after
+# или смещение, с которого продолжается выдача после обычной страницы.
+# scope - хеш параметров запроса, выдавшего курсор: с другими параметрами курсор недействителен
+class Cursor(BaseModel):
+    offset: int = Field(default=0, ge=0)
+    after: List[Union[int, float, str]] | None = Field(default=None, min_length=1)
+    scope: str = ''
+
+    @classmethod
+    def following(cls, page_number: int, page_size: int, count: int) -> 'Cursor | None':
+        if count < page_size:
+            return None
+        return cls(offset=page_number * page_size)
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json(exclude_defaults=True).encode()).rstrip(b'=').decode()
+
+    @classmethod
+    def decode(cls, value: str) -> 'Cursor':
+        try:
+            data = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        except (binascii.Error, ValueError) as exc:
+            raise InvalidCursorError('Invalid cursor') from exc
+        try:
+            return cls.model_validate_json(data)
+        except ValueError as exc:
+            raise InvalidCursorError('Invalid cursor') from exc
+
+
+class ResultIds(BaseOrjsonModel):
+    ids: List[str]
+
+    def cache_tags(self) -> set[str]:
+        return {'film:%s' % film_id for film_id in self.ids}
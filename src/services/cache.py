@@ -0,0 +1,83 @@
+from functools import lru_cache
+from typing import Callable, Type
+
+from fastapi import Depends
+from pydantic import BaseModel
+
+from core.config import CachePolicy, settings
+from db import cache_writer
+from db.admission import FrequencyAdmission
+from db.cache import Cache, LocalCache, RedisCacheStorage, invalidate_tags, sample_keyspace
+from db.cache_stats import cache_stats
+from db.codec import CacheCodec
+from db.redis import ShardedRedis, get_redis
+from models.cache import CacheInvalidation, CacheStatsOut
+
+
+# Запросы, отличающиеся только регистром и пробелами, дают один ключ. Нормализованная строка уходит
+# и в Elasticsearch, поэтому преобразования не выходят за то, что и так делает его анализатор:
+# NFKC и casefold (ß -> ss) изменили бы найденные документы
+def normalize_query(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def build_cache(model_class: Type[BaseModel],
+                redis: ShardedRedis,
+                policy: CachePolicy,
+                index: str,
+                namespace: str | None = None,
+                admission: FrequencyAdmission | None = None,
+                key_tags: Callable[..., set[str]] | None = None) -> Cache:
+    cache_storage = RedisCacheStorage(redis, policy.ttl, settings.stale_cache.stale_time,
+                                      settings.cache_tag_expire, policy.jitter)
+    codec = CacheCodec(model_class,
+                       settings.cache_codec.compress_threshold,
+                       settings.cache_codec.compress_level)
+    local_cache = LocalCache(settings.local_cache.max_size, settings.local_cache.ttl, codec)
+    return Cache(model_class, cache_storage, local_cache,
+                 refresh_ahead_ratio=settings.stale_cache.refresh_ahead_ratio,
+                 refresh_ahead_hits=settings.stale_cache.refresh_ahead_hits,
+                 namespace=namespace,
+                 codec=codec,
+                 negative_cache_time=policy.negative_ttl,
+                 index=index,
+                 max_payload_size=policy.max_payload_bytes,
+                 enabled=policy.enabled,
+                 admission=admission,
+                 key_tags=key_tags)
+
+
+def build_search_cache(model_class: Type[BaseModel],
+                       redis: ShardedRedis,
+                       policy: CachePolicy,
+                       index: str,
+                       namespace: str) -> Cache:
+    admission = None
+    if settings.search_cache.admission_threshold > 1:
+        admission = FrequencyAdmission(settings.search_cache.admission_threshold,
+                                       settings.search_cache.sketch_width)
+    return build_cache(model_class, redis, policy, index, namespace=namespace, admission=admission)
+
+
+class CacheAdminService:
+    def __init__(self, redis: ShardedRedis):
+        self._redis = redis
+
+    def check_token(self, token: str | None) -> bool:
+        return bool(settings.cache_admin_token) and token == settings.cache_admin_token
+
+    async def invalidate(self, invalidation: CacheInvalidation) -> int:
+        return await invalidate_tags(self._redis, invalidation.tags())
+
+    async def stats(self) -> CacheStatsOut:
+        keyspace = await sample_keyspace(self._redis, settings.cache_stats_sample_size)
+        namespaces = {namespace: stats.summary() for namespace, stats in cache_stats.items()}
+        writer = cache_writer.writer.stats() if cache_writer.writer is not None else None
+        return CacheStatsOut(namespaces=namespaces, keyspace=keyspace, writer=writer)
+
+
+@lru_cache()
+def get_cache_admin_service(
+        redis: ShardedRedis = Depends(get_redis),
+) -> CacheAdminService:
+    return CacheAdminService(redis)
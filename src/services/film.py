@@ -1,75 +1,169 @@
-from functools import lru_cache
+from functools import lru_cache, partial
 
 from elasticsearch import AsyncElasticsearch
 from fastapi import Depends
-from redis.asyncio import Redis
 
 from core.config import settings
+from db import request_batch
 from db.abstract import AbstractStorage
-from db.cache import Cache, RedisCacheStorage
+from db.cache import Cache
 from db.elastic import get_elastic
-from db.redis import get_redis
-from models.film import Film
+from db.redis import ShardedRedis, get_redis
+from models.film import Film, MainFilmInformation
+from models.utils import Cursor, ResultIds
 
 from services.abstract import AbstractService
+from services.cache import build_cache, build_search_cache, normalize_query
+from services.result_window import ResultWindow
 from db.base_film import BaseElasticFilmID, BaseElasticFilmSort, BaseElasticFilmSearch
 
 
+# Выдача с фильтром по жанру зависит от жанра, даже если в ней пока нет ни одного фильма
+def genre_filter_tags(genre=None, **_) -> set[str]:
+    return {'genre:%s' % genre} if genre else set()
+
+
 class FilmServiceID(AbstractService):
-    def __init__(self, cache: Cache, storage: AbstractStorage):
+    def __init__(self, cache: Cache, storage: AbstractStorage, main_cache: Cache | None = None):
         self._cache = cache
         self._storage = storage
+        # Урезанные фильмы для списков хранятся отдельно от полных
+        self._main_cache = main_cache
 
     async def get_data(self, film_id: str):
-        film = await self._cache.get(uuid=film_id)
-        if not film:
-            film = await self._storage.get_by_id(film_id)
-            if not film:
-                return None
-            await self._cache.set(film, uuid=film_id)
-        return film
+        return await self._cache.get_or_load(partial(self._storage.get_by_id, film_id),
+                                             uuid=film_id)
+
+    async def put_data(self, film_ids: list[str]) -> list[Film]:
+        await request_batch.flush()
+        films = await self._storage.get_many(film_ids)
+        for film in films:
+            await self._cache.set(film, uuid=film.id)
+        return films
+
+    # Фильмы в порядке film_ids: сначала из кеша, недостающие одним mget из хранилища
+    async def get_many(self, film_ids: list[str]) -> list[Film]:
+        cached = await self._cache.get_many([{'uuid': film_id} for film_id in film_ids])
+        missing = [film_id for film_id, film in zip(film_ids, cached) if film is None]
+        loaded = {film.id: film for film in await self.put_data(missing)} if missing else {}
+        films = [film or loaded.get(film_id) for film_id, film in zip(film_ids, cached)]
+        return [film for film in films if film is not None]
+
+    # Для списков фильмы ищутся в кеше урезанных, затем полных фильмов, а недостающие
+    # запрашиваются только с полями MainFilmInformation и кладутся в кеш урезанных
+    async def get_main_info(self, film_ids: list[str]) -> list[MainFilmInformation]:
+        found: dict[str, MainFilmInformation] = {}
+        if self._main_cache is not None:
+            cached = await self._main_cache.get_many([{'uuid': film_id} for film_id in film_ids])
+            found.update((film.id, film) for film in cached if film is not None)
+        missing = [film_id for film_id in film_ids if film_id not in found]
+        if missing:
+            cached = await self._cache.get_many([{'uuid': film_id} for film_id in missing])
+            found.update((film.id, MainFilmInformation.from_film(film)) for film in cached if film is not None)
+            missing = [film_id for film_id in missing if film_id not in found]
+        if missing:
+            await request_batch.flush()
+            for film in await self._storage.get_many(missing, MainFilmInformation):
+                found[film.id] = film
+                if self._main_cache is not None:
+                    await self._main_cache.set(film, uuid=film.id)
+        return [found[film_id] for film_id in film_ids if film_id in found]
 
 
 class FilmServiceSearch(AbstractService):
-    def __init__(self, storage: AbstractStorage):
+    def __init__(self, cache: Cache, storage: AbstractStorage, window: ResultWindow | None = None):
+        self._cache = cache
         self._storage = storage
+        self._window = window
 
     async def get_data(self, search, page_number, page_size):
-        film = await self._storage.get_list(search, page_number, page_size)
+        search = normalize_query(search)
+        if self._window is not None:
+            films = await self._window.get_page(partial(self._storage.get_ids, search),
+                                                page_number, page_size,
+                                                search=search)
+            if films is not None:
+                return films
+        film = await self._cache.get_or_load(partial(self._storage.get_list, search, page_number, page_size),
+                                             search=search,
+                                             page_number=page_number,
+                                             page_size=page_size)
         if not film:
             return []
         return film
 
+    # Страницы по курсору не кешируются: каждый курсор запрашивают обычно один раз
+    async def get_page(self, search, page_size, cursor: Cursor):
+        await request_batch.flush()
+        return await self._storage.get_page(normalize_query(search), page_size, cursor)
+
 
 class FilmServiceSort(AbstractService):
-    def __init__(self, storage: AbstractStorage):
+    def __init__(self, cache: Cache, storage: AbstractStorage, window: ResultWindow | None = None):
+        self._cache = cache
         self._storage = storage
+        self._window = window
 
     async def get_data(self, page_number, page_size, genre, sort):
-        films = await self._storage.get_list(page_number, page_size, genre, sort)
+        if self._window is not None:
+            films = await self._window.get_page(partial(self._storage.get_ids, genre, sort),
+                                                page_number, page_size,
+                                                genre=genre,
+                                                sort=sort)
+            if films is not None:
+                return films
+        films = await self._cache.get_or_load(partial(self._storage.get_list, page_number, page_size, genre, sort),
+                                              page_number=page_number,
+                                              page_size=page_size,
+                                              genre=genre,
+                                              sort=sort)
         if not films:
             return []
         return films
 
+    async def get_page(self, page_size, genre, sort, cursor: Cursor):
+        await request_batch.flush()
+        return await self._storage.get_page(page_size, genre, sort, cursor)
+
 
 @lru_cache()
 def get_film_service_id(
-        redis: Redis = Depends(get_redis),
+        redis: ShardedRedis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> FilmServiceID:
-    cache_storage = RedisCacheStorage(redis, settings.genre_cache_expire)
-    return FilmServiceID(Cache(Film, cache_storage), BaseElasticFilmID(elastic))
+    cache = build_cache(Film, redis, settings.cache_policy('film'), 'movies')
+    main_cache = build_cache(MainFilmInformation, redis, settings.cache_policy('film'), 'movies',
+                             namespace='FilmMain')
+    return FilmServiceID(cache, BaseElasticFilmID(elastic), main_cache)
 
 
 @lru_cache()
 def get_film_service_search(
+        redis: ShardedRedis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> FilmServiceSearch:
-    return FilmServiceSearch(BaseElasticFilmSearch(elastic))
+    cache = build_search_cache(MainFilmInformation, redis, settings.cache_policy('film_search'), 'movies',
+                               namespace='FilmSearch')
+    window = None
+    if settings.result_window.enabled:
+        window_cache = build_search_cache(ResultIds, redis, settings.cache_policy('film_search'), 'movies',
+                                          namespace='FilmSearchWindow')
+        window = ResultWindow(window_cache, get_film_service_id(redis=redis, elastic=elastic).get_main_info,
+                              settings.result_window.size)
+    return FilmServiceSearch(cache, BaseElasticFilmSearch(elastic), window)
 
 
 @lru_cache()
 def get_film_service_sort(
+        redis: ShardedRedis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic)
 ) -> FilmServiceSort:
-    return FilmServiceSort(BaseElasticFilmSort(elastic))
+    cache = build_cache(MainFilmInformation, redis, settings.cache_policy('film_sort'), 'movies',
+                        namespace='FilmSort', key_tags=genre_filter_tags)
+    window = None
+    if settings.result_window.enabled:
+        window_cache = build_cache(ResultIds, redis, settings.cache_policy('film_sort'), 'movies',
+                                   namespace='FilmSortWindow', key_tags=genre_filter_tags)
+        window = ResultWindow(window_cache, get_film_service_id(redis=redis, elastic=elastic).get_main_info,
+                              settings.result_window.size)
+    return FilmServiceSort(cache, BaseElasticFilmSort(elastic), window)
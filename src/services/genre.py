@@ -1,16 +1,18 @@
-from functools import lru_cache
+from functools import lru_cache, partial
 from elasticsearch import AsyncElasticsearch
 from fastapi import Depends
-from redis.asyncio import Redis
 
 from core.config import settings
+from db import request_batch
 from db.abstract import AbstractStorage
-from db.cache import Cache, RedisCacheStorage
+from db.cache import Cache
 from services.abstract import AbstractService
+from services.cache import build_cache
 from db.elastic import get_elastic
-from db.redis import get_redis
+from db.redis import ShardedRedis, get_redis
 from db.base_genre import BaseElasticGenreID, BaseElasticAllGenre
 from models.genre import Genre
+from models.utils import Cursor
 
 
 class GenreServiceID(AbstractService):
@@ -19,13 +21,12 @@ class GenreServiceID(AbstractService):
         self._storage = storage
 
     async def get_data(self, genre_id: str) -> Genre | None:
-        genre = await self._cache.get(uuid=genre_id)
-        if not genre:
-            genre = await self._storage.get_by_id(genre_id)
-            if not genre:
-                return None
-            await self._cache.set(genre, uuid=genre_id)
-        return genre
+        return await self._cache.get_or_load(partial(self._storage.get_by_id, genre_id),
+                                             uuid=genre_id)
+
+    async def put_data(self, genres: list[Genre]):
+        for genre in genres:
+            await self._cache.set(genre, uuid=genre.id)
 
 
 class GenreServiceAll(AbstractService):
@@ -34,33 +35,33 @@ class GenreServiceAll(AbstractService):
         self._storage = storage
 
     async def get_data(self, page_number, page_size, sort) -> list[Genre] | None:
-        genres = await self._cache.get(page_size=page_size,
-                                       page_number=page_number,
-                                       sort=sort)
+        genres = await self._cache.get_or_load(partial(self._storage.get_list, page_number, page_size, sort),
+                                               page_size=page_size,
+                                               page_number=page_number,
+                                               sort=sort)
         if not genres:
-            genres = await self._storage.get_list(page_number, page_size, sort)
-            if not genres:
-                return []
-            await self._cache.set(genres,
-                                  page_size=page_size,
-                                  page_number=page_number,
-                                  sort=sort)
+            return []
         return genres
 
+    # Страницы по курсору не кешируются: каждый курсор запрашивают обычно один раз
+    async def get_page(self, page_size, sort, cursor: Cursor) -> tuple[list[Genre], Cursor | None]:
+        await request_batch.flush()
+        return await self._storage.get_page(page_size, sort, cursor)
+
 
 @lru_cache
 def get_genre_service_id(
-    redis: Redis = Depends(get_redis),
+    redis: ShardedRedis = Depends(get_redis),
     elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> GenreServiceID:
-    cache_storage = RedisCacheStorage(redis, settings.genre_cache_expire)
-    return GenreServiceID(Cache(Genre, cache_storage), BaseElasticGenreID(elastic))
+    cache = build_cache(Genre, redis, settings.cache_policy('genre'), 'genres')
+    return GenreServiceID(cache, BaseElasticGenreID(elastic))
 
 
 @lru_cache()
 def get_genre_service_all(
-        redis: Redis = Depends(get_redis),
+        redis: ShardedRedis = Depends(get_redis),
         elastic:  AsyncElasticsearch = Depends(get_elastic),
 ) -> GenreServiceAll:
-    cache_storage = RedisCacheStorage(redis, settings.genre_cache_expire)
-    return GenreServiceAll(Cache(Genre, cache_storage), BaseElasticAllGenre(elastic))
+    cache = build_cache(Genre, redis, settings.cache_policy('genre_list'), 'genres')
+    return GenreServiceAll(cache, BaseElasticAllGenre(elastic))
@@ -1,19 +1,20 @@
-from functools import lru_cache
+from functools import lru_cache, partial
 
 from elasticsearch import AsyncElasticsearch
 from fastapi import Depends
-from redis.asyncio import Redis
 
 from core.config import settings
+from db import request_batch
 from db.abstract import AbstractStorage
+from db.cache import Cache
 from db.base_person import BaseElasticPersonID, BaseElasticPersonSearch, BaseElasticFilmByPerson
-from db.cache import RedisCacheStorage, Cache
 from db.elastic import get_elastic
-from db.redis import get_redis
+from db.redis import ShardedRedis, get_redis
+from models.film import MainFilmInformation
 from models.person import Person
+from models.utils import Cursor
 from services.abstract import AbstractService
-
-PERSON_CACHE_EXPIRE_IN_SECONDS = settings.person_cache_expire
+from services.cache import build_cache, build_search_cache, normalize_query
 
 
 class PersonServiceID(AbstractService):
@@ -22,55 +23,76 @@ class PersonServiceID(AbstractService):
         self._storage = storage
 
     async def get_data(self, person_id: str):
-        person = await self._cache.get(uuid=person_id)
-        if not person:
-            person = await self._storage.get_by_id(person_id)
-            if not person:
-                return None
-            await self._cache.set(person, uuid=person_id)
-        return person
+        return await self._cache.get_or_load(partial(self._storage.get_by_id, person_id),
+                                             uuid=person_id)
 
 
 class PersonServiceSearch(AbstractService):
-    def __init__(self, storage: AbstractStorage):
+    def __init__(self, cache: Cache, storage: AbstractStorage):
+        self._cache = cache
         self._storage = storage
 
     async def get_data(self, search, page_number, page_size):
-        person = await self._storage.get_list(search, page_number, page_size)
+        search = normalize_query(search)
+        person = await self._cache.get_or_load(partial(self._storage.get_list, search, page_number, page_size),
+                                               search=search,
+                                               page_number=page_number,
+                                               page_size=page_size)
         if not person:
             return []
         return person
 
+    # Страницы по курсору не кешируются: каждый курсор запрашивают обычно один раз
+    async def get_page(self, search, page_size, cursor: Cursor):
+        await request_batch.flush()
+        return await self._storage.get_page(normalize_query(search), page_size, cursor)
+
 
 class FilmByPersonService(AbstractService):
-    def __init__(self, storage: AbstractStorage):
+    def __init__(self, cache: Cache, storage: AbstractStorage):
+        self._cache = cache
         self._storage = storage
 
     async def get_data(self, person_id, page_number, page_size):
-        films = await self._storage.get_list(person_id, page_number, page_size)
+        films = await self._cache.get_or_load(partial(self._storage.get_list, person_id, page_number, page_size),
+                                              person_id=person_id,
+                                              page_number=page_number,
+                                              page_size=page_size)
         if not films:
             return []
         return films
 
+    async def get_page(self, person_id, page_size, cursor: Cursor):
+        await request_batch.flush()
+        return await self._storage.get_page(person_id, page_size, cursor)
+
 
 @lru_cache()
 def get_person_service_id(
-        redis: Redis = Depends(get_redis),
+        redis: ShardedRedis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> PersonServiceID:
-    cache_storage = RedisCacheStorage(redis, settings.genre_cache_expire)
-    return PersonServiceID(Cache(Person, cache_storage), BaseElasticPersonID(elastic))
+    cache = build_cache(Person, redis, settings.cache_policy('person'), 'persons')
+    return PersonServiceID(cache, BaseElasticPersonID(elastic))
 
 
 @lru_cache()
 def get_person_service_search(
+        redis: ShardedRedis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> PersonServiceSearch:
-    return PersonServiceSearch(BaseElasticPersonSearch(elastic))
+    cache = build_search_cache(Person, redis, settings.cache_policy('person_search'), 'persons',
+                               namespace='PersonSearch')
+    return PersonServiceSearch(cache, BaseElasticPersonSearch(elastic))
 
 
 @lru_cache()
 def get_film_by_person_service(
+        redis: ShardedRedis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic)
 ) -> FilmByPersonService:
-    return FilmByPersonService(BaseElasticFilmByPerson(elastic))
+    # Фильмография меняется вместе с персоной, а не только с фильмами из выдачи
+    cache = build_cache(MainFilmInformation, redis, settings.cache_policy('film_by_person'), 'movies',
+                        namespace='FilmByPerson',
+                        key_tags=lambda person_id, **_: {'person:%s' % person_id})
+    return FilmByPersonService(cache, BaseElasticFilmByPerson(elastic))
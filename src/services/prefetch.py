@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+from elasticsearch import AsyncElasticsearch
+from fastapi import BackgroundTasks, Depends
+
+from core.config import settings
+from db.elastic import get_elastic
+from db.redis import ShardedRedis, get_redis
+from services.film import FilmServiceID, get_film_service_id
+
+logger = logging.getLogger(__name__)
+
+
+# После ответа со списком фильмов подгружает в кеш их карточки и, при желании, следующую страницу
+class Prefetcher:
+    def __init__(self,
+                 film_service: FilmServiceID,
+                 enabled: bool,
+                 concurrency: int,
+                 max_delay: float,
+                 cooldown: float):
+        self._film_service = film_service
+        self._enabled = enabled
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._max_delay = max_delay
+        self._cooldown = cooldown
+        self._disabled_until = 0.0
+
+    def is_active(self) -> bool:
+        return self._enabled and self._disabled_until <= time.monotonic() and not self._semaphore.locked()
+
+    def schedule(self,
+                 background_tasks: BackgroundTasks,
+                 film_ids: list[str],
+                 next_page: Callable[[], Awaitable] | None = None):
+        if not self.is_active():
+            return
+        background_tasks.add_task(self._run, time.monotonic(), film_ids, next_page)
+
+    async def _run(self, scheduled_at: float, film_ids: list[str], next_page: Callable[[], Awaitable] | None):
+        # Фоновая задача стартует после отправки ответа; большая задержка старта
+        # значит, что event loop перегружен, и предзагрузка на время отключается
+        delay = time.monotonic() - scheduled_at
+        if delay > self._max_delay:
+            self._disabled_until = time.monotonic() + self._cooldown
+            logger.info('Prefetch paused for %s seconds: event loop lag %.3f', self._cooldown, delay)
+            return
+        if self._semaphore.locked():
+            return
+        async with self._semaphore:
+            try:
+                await self._film_service.get_many(film_ids)
+                if next_page is not None:
+                    await next_page()
+            except Exception as exc:
+                logger.warning('Prefetch failed: %r', exc)
+
+
+@lru_cache()
+def get_prefetcher(
+        redis: ShardedRedis = Depends(get_redis),
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+) -> Prefetcher:
+    return Prefetcher(get_film_service_id(redis=redis, elastic=elastic),
+                      settings.prefetch.enabled,
+                      settings.prefetch.concurrency,
+                      settings.prefetch.max_delay,
+                      settings.prefetch.cooldown)
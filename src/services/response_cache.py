@@ -0,0 +1,90 @@
+import hashlib
+from functools import lru_cache
+from typing import Iterable, Type
+
+import orjson
+from fastapi import Depends, Request, Response
+from pydantic import BaseModel
+
+from core.config import settings
+from db.cache import LocalCache, RedisCacheStorage
+from db.cache_stats import cache_stats
+from db.generation import generations
+from db.redis import ShardedRedis, get_redis
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+class ResponseCache:
+    def __init__(self, storage: RedisCacheStorage, local: LocalCache, enabled: bool, max_payload_size: int = 0):
+        self._storage = storage
+        self._local = local
+        self._enabled = enabled
+        self._max_payload_size = max_payload_size
+        self._schema_hashes: dict[Type[BaseModel], str] = {}
+        self._stats = cache_stats['Response']
+
+    def _schema_hash(self, response_model: Type[BaseModel]) -> str:
+        schema_hash = self._schema_hashes.get(response_model)
+        if schema_hash is None:
+            schema = orjson.dumps(response_model.model_json_schema(), option=orjson.OPT_SORT_KEYS)
+            schema_hash = hashlib.sha1(schema).hexdigest()[:8]
+            self._schema_hashes[response_model] = schema_hash
+        return schema_hash
+
+    def _key(self, request: Request, response_model: Type[BaseModel]) -> str:
+        params = orjson.dumps([request.url.path, sorted(request.query_params.multi_items())])
+        return 'Response:%s.%s:%s' % (self._schema_hash(response_model),
+                                       generations.current(),
+                                       hashlib.sha1(params).hexdigest())
+
+    async def get(self, request: Request, response_model: Type[BaseModel]) -> Response | None:
+        if not self._enabled:
+            return None
+        key = self._key(request, response_model)
+        body = self._local.get(key)
+        if body is not None:
+            self._stats.local_hits += 1
+        else:
+            body = await self._storage.get(key)
+            if not body:
+                self._stats.misses += 1
+                return None
+            self._stats.redis_hits += 1
+            self._stats.read_bytes += len(body)
+            self._local.set(key, body)
+        return Response(content=body, media_type=JSON_MEDIA_TYPE)
+
+    async def set(self,
+                  request: Request,
+                  response: BaseModel,
+                  tags: Iterable[str] = ()) -> Response | BaseModel:
+        if not self._enabled:
+            return response
+        key = self._key(request, type(response))
+        body = response.__pydantic_serializer__.to_json(response)
+        if 0 < self._max_payload_size < len(body):
+            self._stats.oversized += 1
+            return Response(content=body, media_type=JSON_MEDIA_TYPE)
+        await self._storage.set(key, body, tags=tags)
+        self._local.set(key, body)
+        self._stats.writes += 1
+        self._stats.written_bytes += len(body)
+        return Response(content=body, media_type=JSON_MEDIA_TYPE)
+
+
+def collect_tags(items: Iterable) -> set[str]:
+    tags = set()
+    for item in items:
+        tags |= item.cache_tags()
+    return tags
+
+
+@lru_cache()
+def get_response_cache(
+        redis: ShardedRedis = Depends(get_redis),
+) -> ResponseCache:
+    policy = settings.cache_policy('response')
+    storage = RedisCacheStorage(redis, policy.ttl, tag_time=settings.cache_tag_expire, jitter=policy.jitter)
+    local_cache = LocalCache(settings.local_cache.max_size, settings.local_cache.ttl)
+    return ResponseCache(storage, local_cache, policy.enabled, policy.max_payload_bytes)
@@ -0,0 +1,34 @@
+from functools import partial
+from typing import Awaitable, Callable
+
+from db.cache import Cache
+from models.utils import ResultIds
+
+
+# Первый запрос к выдаче кеширует упорядоченный список первых size id,
+# следующие страницы вырезаются из него и собираются из кеша объектов
+class ResultWindow:
+    def __init__(self,
+                 cache: Cache,
+                 hydrate: Callable[[list[str]], Awaitable[list]],
+                 size: int):
+        self._cache = cache
+        self._hydrate = hydrate
+        self._size = size
+
+    # None - страница за пределами окна, её нужно запрашивать у хранилища напрямую
+    async def get_page(self,
+                       loader: Callable[[int], Awaitable[ResultIds | None]],
+                       page_number: int,
+                       page_size: int,
+                       **kwargs) -> list | None:
+        end = page_number * page_size
+        if end > self._size:
+            return None
+        window = await self._cache.get_or_load(partial(loader, self._size), **kwargs)
+        if window is None:
+            return []
+        ids = window.ids[end - page_size:end]
+        if not ids:
+            return []
+        return await self._hydrate(ids)
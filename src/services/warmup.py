@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import Awaitable
+
+from elasticsearch import AsyncElasticsearch
+
+from core.config import settings
+from db.redis import ShardedRedis
+from models.genre import Genre
+from services.film import FilmServiceID, FilmServiceSort, get_film_service_id, get_film_service_sort
+from services.genre import GenreServiceAll, GenreServiceID, get_genre_service_all, get_genre_service_id
+
+logger = logging.getLogger(__name__)
+
+WARMUP_LOCK_KEY = 'warmup:lock'
+MAX_GENRE_PAGES = 100
+DEFAULT_FILM_SORT = '-imdb_rating'
+DEFAULT_GENRE_SORT = 'name'
+
+
+class CacheWarmer:
+    def __init__(self,
+                 film_service: FilmServiceID,
+                 film_sort_service: FilmServiceSort,
+                 genre_service: GenreServiceID,
+                 genre_all_service: GenreServiceAll):
+        self._film_service = film_service
+        self._film_sort_service = film_sort_service
+        self._genre_service = genre_service
+        self._genre_all_service = genre_all_service
+        self._semaphore = asyncio.Semaphore(settings.warmup.concurrency)
+
+    async def _limited(self, coro: Awaitable):
+        async with self._semaphore:
+            return await coro
+
+    async def _warm_genres(self) -> list[Genre]:
+        page_size = settings.warmup.page_size
+        genres = []
+        for page_number in range(1, MAX_GENRE_PAGES + 1):
+            page = await self._genre_all_service.get_data(page_number, page_size, DEFAULT_GENRE_SORT)
+            genres.extend(page)
+            if len(page) < page_size:
+                break
+        await self._genre_service.put_data(genres)
+        return genres
+
+    async def _warm_genre_films(self, genre: Genre):
+        films = await self._film_sort_service.get_data(1, settings.warmup.films_per_genre,
+                                                       genre.id, DEFAULT_FILM_SORT)
+        # Окно выдачи уже могло загрузить эти фильмы: из хранилища догружаются только недостающие
+        await self._film_service.get_many([film.id for film in films])
+        await self._film_sort_service.get_data(1, settings.warmup.page_size, genre.id, DEFAULT_FILM_SORT)
+
+    async def run(self):
+        genres = await self._warm_genres()
+        tasks = [
+            self._limited(self._film_sort_service.get_data(page_number, settings.warmup.page_size,
+                                                           None, DEFAULT_FILM_SORT))
+            for page_number in range(1, settings.warmup.main_pages + 1)
+        ]
+        tasks.extend(self._limited(self._warm_genre_films(genre)) for genre in genres)
+        await asyncio.gather(*tasks)
+        logger.info('Cache warm-up finished: %s genres, %s main pages', len(genres), settings.warmup.main_pages)
+
+
+async def warm_up_cache(redis: ShardedRedis, elastic: AsyncElasticsearch):
+    if not settings.warmup.enabled:
+        return
+    # Прогревает Redis только один воркер, остальные сразу начинают работу
+    locked = await redis.call(WARMUP_LOCK_KEY,
+                              lambda node: node.set(WARMUP_LOCK_KEY, 1, nx=True, ex=settings.warmup.timeout),
+                              default=False)
+    if not locked:
+        return
+
+    # Сервисы берутся из тех же фабрик, что и в ручках, поэтому прогревается и кеш процесса
+    warmer = CacheWarmer(
+        film_service=get_film_service_id(redis=redis, elastic=elastic),
+        film_sort_service=get_film_service_sort(redis=redis, elastic=elastic),
+        genre_service=get_genre_service_id(redis=redis, elastic=elastic),
+        genre_all_service=get_genre_service_all(redis=redis, elastic=elastic),
+    )
+    try:
+        await asyncio.wait_for(warmer.run(), timeout=settings.warmup.timeout)
+    except asyncio.TimeoutError:
+        logger.warning('Cache warm-up stopped after %s seconds', settings.warmup.timeout)
+    except Exception as exc:
+        logger.warning('Cache warm-up failed: %r', exc)
@@ -48,6 +48,21 @@ def make_get_request(aiohttp_client):
     return inner
 
 
+@pytest.fixture(scope='session')
+def make_post_request(aiohttp_client):
+    async def inner(data: dict, method: str, headers: dict | None = None):
+        url = f'{settings.fastapi.url()}/{method}'
+        async with aiohttp_client.post(url, json=data, headers=headers) as response:
+            body = await response.json()
+            status = response.status
+            return {
+                'body': body,
+                'status': status
+            }
+
+    return inner
+
+
 @pytest.fixture(scope='session')
 async def redis_client():
     client = redis.Redis(host=settings.redis.host, port=settings.redis.port)
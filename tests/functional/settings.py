@@ -25,6 +25,7 @@ class TestElasticsearchSettings(BaseSettings):
 class TestFastAPISettings(BaseSettings):
     host: str = Field(validation_alias='FASTAPI_HOST', default='localhost')
     port: int = Field(validation_alias='FASTAPI_PORT', default=80)
+    cache_admin_token: str = Field(validation_alias='CACHE_ADMIN_TOKEN', default='')
 
     def url(self):
         return f'http://{self.host}:{self.port}/api/v1'
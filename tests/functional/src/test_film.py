@@ -1,7 +1,9 @@
 import pytest
-import json
 from http import HTTPStatus
 
+from functional.settings import settings
+from functional.utils.helpers import cache_key, decode_cache
+
 pytestmark = pytest.mark.asyncio
 
 
@@ -54,9 +56,10 @@ async def test_movie_get_by_id(es_client, redis_client, make_get_request,
 
     await es_client.delete(index='movies', id=film_id)
 
-    redis_data = redis_client.get("Film:query:{'uuid': '%s'}" % film_id)
-    redis_client.delete("Film:query:{'uuid': '%s'}" % film_id)
-    redis_data = json.loads(redis_data)
+    key = cache_key(redis_client, 'Film', uuid=film_id)
+    redis_data = redis_client.get(key)
+    redis_client.delete(key)
+    redis_data = decode_cache(redis_data)
 
     assert redis_data
     assert response['status'] == status
@@ -78,6 +81,18 @@ async def test_movie_invalid_id(make_get_request):
     assert movie.get('body') == {"detail": "film not found"}
 
 
+async def test_movie_invalid_id_negative_cache(make_get_request, redis_client):
+    film_id = 'missing_film'
+    movie = await make_get_request(params={}, method=f'films/{film_id}')
+
+    key = cache_key(redis_client, 'Film', uuid=film_id)
+    redis_data = redis_client.get(key)
+    redis_client.delete(key)
+
+    assert movie.get('status') == HTTPStatus.NOT_FOUND
+    assert redis_data == b'\x01\x04'
+
+
 async def test_movie_search_not_found(make_get_request):
     error_film = await make_get_request(method='films/search', params={
         'search': 'movie123456',
@@ -154,3 +169,66 @@ async def test_movie_main_page_invalid_genre(make_get_request):
 
     assert error_film.get('status') == HTTPStatus.NOT_FOUND
     assert error_film.get('body') == {'detail': 'film not found'}
+
+
+async def test_movie_main_page_cached(make_get_request, redis_client, add_movies):
+    params = {'sort': '-imdb_rating', 'page_number': 2, 'page_size': 5}
+    films = await make_get_request(method='films', params=params)
+
+    key = cache_key(redis_client, 'FilmSortWindow', genre=None, sort='-imdb_rating')
+    redis_data = redis_client.get(key)
+    redis_client.delete(key)
+
+    assert films.get('status') == HTTPStatus.OK
+    assert redis_data
+    window_ids = decode_cache(redis_data)['ids']
+    assert [film['id'] for film in films['body']['results']] == window_ids[5:10]
+
+
+async def test_movie_cache_invalidation(make_get_request, make_post_request, redis_client, add_movies):
+    await make_get_request(params={}, method='films/test_1')
+    key = cache_key(redis_client, 'Film', uuid='test_1')
+    assert redis_client.exists(key)
+
+    forbidden = await make_post_request(data={'films': ['test_1']}, method='cache/invalidate')
+    assert forbidden.get('status') == HTTPStatus.FORBIDDEN
+
+    result = await make_post_request(data={'persons': ['ef86b8ff-3c82-4d31-ad8e-72b69f4e3f88']},
+                                     method='cache/invalidate',
+                                     headers={'X-Cache-Token': settings.fastapi.cache_admin_token})
+    assert result.get('status') == HTTPStatus.OK
+    assert result.get('body')['deleted'] >= 1
+    assert not redis_client.exists(key)
+
+
+async def test_movie_main_page_cursor_pagination(make_get_request, add_movies):
+    params = {'sort': '-imdb_rating', 'genre': 'test_id_movie', 'page_size': 10}
+    films = await make_get_request(method='films', params=params)
+    assert films.get('status') == HTTPStatus.OK
+
+    ids = [film['id'] for film in films['body']['results']]
+    ratings = [film['imdb_rating'] for film in films['body']['results']]
+    cursor = films['body']['next_cursor']
+    while cursor:
+        films = await make_get_request(method='films', params=dict(params, cursor=cursor))
+        assert films.get('status') == HTTPStatus.OK
+        ids.extend(film['id'] for film in films['body']['results'])
+        ratings.extend(film['imdb_rating'] for film in films['body']['results'])
+        cursor = films['body']['next_cursor']
+
+    assert len(ids) == len(set(ids)) == 33
+    assert ratings == sorted(ratings, reverse=True)
+
+
+async def test_movie_cursor_from_other_query(make_get_request, add_movies):
+    films = await make_get_request(method='films', params={'sort': '-imdb_rating', 'page_size': 5})
+    cursor = films['body']['next_cursor']
+    assert cursor
+
+    other_sort = await make_get_request(method='films', params={'sort': 'title', 'page_size': 5, 'cursor': cursor})
+    other_route = await make_get_request(method='genres', params={'page_size': 5, 'cursor': cursor})
+    broken = await make_get_request(method='films', params={'sort': '-imdb_rating', 'cursor': 'broken'})
+
+    for response in (other_sort, other_route, broken):
+        assert response.get('status') == HTTPStatus.BAD_REQUEST
+        assert response.get('body') == {'detail': 'invalid pagination cursor'}
@@ -1,7 +1,8 @@
-import json
 import pytest
 from http import HTTPStatus
 
+from functional.utils.helpers import cache_key, decode_cache
+
 pytestmark = pytest.mark.asyncio
 
 
@@ -43,9 +44,10 @@ async def test_genre(es_client, make_get_request, redis_client,
     response = await make_get_request({}, "genres/%s/" % genre_id)
     await es_client.delete(index="genres", id=genre_id)
 
-    redis_data = redis_client.get("Genre:query:{'uuid': '%s'}" % genre_id)
-    redis_client.delete("Genre:query:{'uuid': '%s'}" % genre_id)
-    redis_data = json.loads(redis_data)
+    key = cache_key(redis_client, 'Genre', uuid=genre_id)
+    redis_data = redis_client.get(key)
+    redis_client.delete(key)
+    redis_data = decode_cache(redis_data)
 
     assert redis_data
     assert redis_data == genre_data
@@ -1,8 +1,9 @@
-import json
 import uuid
 import pytest
 from http import HTTPStatus
 
+from functional.utils.helpers import cache_key, decode_cache
+
 pytestmark = pytest.mark.asyncio
 
 
@@ -53,9 +54,10 @@ async def test_person_pk(es_client, redis_client, make_get_request,
 
     await es_client.delete(index="persons", id=person_id)
 
-    redis_data = redis_client.get("Person:query:{'uuid': '%s'}" % person_id)
-    redis_client.delete("Person:query:{'uuid': '%s'}" % person_id)
-    redis_data = json.loads(redis_data)
+    key = cache_key(redis_client, 'Person', uuid=person_id)
+    redis_data = redis_client.get(key)
+    redis_client.delete(key)
+    redis_data = decode_cache(redis_data)
 
     assert redis_data
     assert redis_data == person_data
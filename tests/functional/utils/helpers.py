@@ -0,0 +1,27 @@
+import hashlib
+import json
+import time
+import zlib
+
+
+def cache_key(redis_client, namespace: str, timeout: float = 1.0, **params) -> str | None:
+    # Ключ кеша: <namespace>:<поколение схемы и индекса>:<sha1 параметров запроса>
+    query = json.dumps(params, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    pattern = '%s:*:%s' % (namespace, hashlib.sha1(query.encode()).hexdigest())
+    # Запись в кеш выполняется в фоне после ответа, поэтому ключ может появиться не сразу
+    deadline = time.monotonic() + timeout
+    while True:
+        for key in redis_client.scan_iter(match=pattern):
+            return key
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.05)
+
+
+def decode_cache(data: bytes):
+    # Формат записи кеша: [версия][флаги][тело], флаг 0x02 - тело сжато zlib
+    version, flags, body = data[0], data[1], data[2:]
+    assert version == 1
+    if flags & 0x02:
+        body = zlib.decompress(body)
+    return json.loads(body)
@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+import fakeredis
+import pytest
+from fakeredis import aioredis
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'src'))
+os.environ.setdefault('REDIS_HOST', 'localhost')
+os.environ.setdefault('REDIS_PORT', '6379')
+os.environ.setdefault('ELASTIC_HOST', 'localhost')
+os.environ.setdefault('ELASTIC_PORT', '9200')
+
+from db.redis import ShardedRedis  # noqa: E402
+
+
+@pytest.fixture
+def redis_servers():
+    return {name: fakeredis.FakeServer() for name in ('redis-1:6379', 'redis-2:6379', 'redis-3:6379')}
+
+
+@pytest.fixture
+def sharded_redis(redis_servers):
+    return ShardedRedis({name: aioredis.FakeRedis(server=server) for name, server in redis_servers.items()})
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from db.cache import Cache, RedisCacheStorage
+from models.genre import Genre
+
+pytestmark = pytest.mark.asyncio
+
+CACHE_TIME = 60
+STALE_TIME = 30
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return Genre(id='g1', name='Fresh')
+
+
+@pytest.fixture
+def cache(sharded_redis, request):
+    storage = RedisCacheStorage(sharded_redis, cache_time=CACHE_TIME, stale_time=STALE_TIME)
+    return Cache(Genre, storage, refresh_ahead_ratio=0.2, refresh_ahead_hits=2, namespace=request.node.name)
+
+
+async def _cached(cache, sharded_redis, ttl: int):
+    await cache.set(Genre(id='g1', name='Cached'), uuid='g1')
+    key = cache._key(uuid='g1')
+    node = sharded_redis.nodes[sharded_redis.node_name(key)]
+    await node.expire(key, ttl)
+    return node, key
+
+
+async def _refreshed(cache, loader):
+    loader.release.set()
+    await asyncio.gather(*cache._in_flight.values())
+
+
+async def test_soft_expired_key_is_served_stale_and_refreshed_once(cache, sharded_redis):
+    node, key = await _cached(cache, sharded_redis, STALE_TIME - 10)
+    loader = Loader()
+
+    results = await asyncio.gather(*(cache.get_or_load(loader, uuid='g1') for _ in range(3)))
+    assert [genre.name for genre in results] == ['Cached'] * 3
+    await _refreshed(cache, loader)
+
+    assert loader.calls == 1
+    assert (await cache.get(uuid='g1')).name == 'Fresh'
+    assert await node.ttl(key) > STALE_TIME
+
+
+async def test_hot_key_in_refresh_window_is_refreshed_ahead(cache, sharded_redis):
+    await _cached(cache, sharded_redis, STALE_TIME + 10)
+    loader = Loader()
+
+    assert (await cache.get_or_load(loader, uuid='g1')).name == 'Cached'
+    assert loader.calls == 0
+    assert (await cache.get_or_load(loader, uuid='g1')).name == 'Cached'
+    await _refreshed(cache, loader)
+
+    assert loader.calls == 1
+    assert (await cache.get(uuid='g1')).name == 'Fresh'
+
+
+@pytest.mark.parametrize('hits, ttl', [
+    (1, STALE_TIME + 10),
+    (3, STALE_TIME + CACHE_TIME),
+])
+async def test_cold_or_fresh_key_is_not_refreshed(cache, sharded_redis, hits, ttl):
+    await _cached(cache, sharded_redis, ttl)
+    loader = Loader()
+
+    for _ in range(hits):
+        assert (await cache.get_or_load(loader, uuid='g1')).name == 'Cached'
+
+    assert loader.calls == 0
+    assert not cache._in_flight
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from db import cache_writer
+from db.cache import Cache, RedisCacheStorage, invalidate_tags
+from db.cache_writer import TAG_PREFIX, write_entry
+from models.film import MainFilmInformation
+from models.utils import ResultIds
+from services.film import genre_filter_tags
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _write(redis, key: str, ttl: int, tags: tuple[str, ...]):
+    pipe = redis.pipeline()
+    write_entry(pipe, key, b'value', ttl, tags, 60 * 60 * 24)
+    assert await pipe.execute()
+
+
+async def test_expired_members_are_pruned_on_write(sharded_redis, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(cache_writer.time, 'time', lambda: now - 600)
+    await _write(sharded_redis, 'FilmSort:old', 60, ('genre:action',))
+    monkeypatch.setattr(cache_writer.time, 'time', lambda: now)
+    await _write(sharded_redis, 'FilmSort:new', 60, ('genre:action',))
+
+    tag_key = TAG_PREFIX + 'genre:action'
+    node = sharded_redis.nodes[sharded_redis.node_name(tag_key)]
+    assert await node.zrange(tag_key, 0, -1) == [b'FilmSort:new']
+
+
+async def test_invalidate_deletes_live_keys_of_tag(sharded_redis):
+    await _write(sharded_redis, 'Film:1', 60, ('film:1', 'genre:action'))
+    await _write(sharded_redis, 'FilmSort:1', 60, ('film:1',))
+    await _write(sharded_redis, 'Film:2', 60, ('film:2', 'genre:action'))
+
+    assert await invalidate_tags(sharded_redis, ['film:1']) == 2
+
+    for key, exists in (('Film:1', 0), ('FilmSort:1', 0), ('Film:2', 1)):
+        assert await sharded_redis.nodes[sharded_redis.node_name(key)].exists(key) == exists
+
+
+async def test_film_by_person_page_is_tagged_with_person(sharded_redis):
+    cache = Cache(MainFilmInformation, RedisCacheStorage(sharded_redis, cache_time=60), namespace='FilmByPersonTags',
+                  key_tags=lambda person_id, **_: {'person:%s' % person_id})
+    params = {'person_id': 'p1', 'page_number': 1, 'page_size': 10}
+    await cache.set([MainFilmInformation(id='f1', title='t', imdb_rating=8.0, genres_list=[])], **params)
+
+    assert await invalidate_tags(sharded_redis, ['person:p1']) == 1
+    assert await cache._storage.get(cache._key(**params)) is None
+
+
+@pytest.mark.parametrize('tag', ['film:f2', 'genre:g1'])
+async def test_result_window_is_tagged_with_films_and_genre_filter(sharded_redis, tag):
+    cache = Cache(ResultIds, RedisCacheStorage(sharded_redis, cache_time=60), namespace='FilmSortWindowTags',
+                  key_tags=genre_filter_tags)
+    params = {'genre': 'g1', 'sort': '-imdb_rating'}
+    await cache.set(ResultIds(ids=['f1', 'f2']), **params)
+
+    assert await invalidate_tags(sharded_redis, [tag]) == 1
+    assert await cache._storage.get(cache._key(**params)) is None
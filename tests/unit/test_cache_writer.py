@@ -0,0 +1,24 @@
+import asyncio
+
+import pytest
+
+from db.cache_writer import CacheWriter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_close_finishes_batch_in_flight(sharded_redis):
+    writer = CacheWriter(sharded_redis, queue_size=10, batch_size=2)
+    for number in range(5):
+        writer.put('Film:%s' % number, b'value', 60, ('film:%s' % number,), 3600)
+    writer.start()
+    # Задача успевает забрать первый пакет и ждёт ответа Redis
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    await writer.close()
+
+    assert writer.stats() == {'queued': 0, 'written': 5, 'dropped': 0}
+    for number in range(5):
+        key = 'Film:%s' % number
+        assert await sharded_redis.nodes[sharded_redis.node_name(key)].get(key) == b'value'
@@ -0,0 +1,18 @@
+import pytest
+from pydantic import ValidationError
+
+from core.config import RateLimitSettings
+
+
+def test_route_cost_above_tier_limit_is_rejected(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_TIERS', '{"anonymous": {"limit": 3}}')
+
+    with pytest.raises(ValidationError, match="tier 'anonymous'"):
+        RateLimitSettings()
+
+
+def test_tier_limits_covering_route_costs_are_accepted(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_TIERS', '{"anonymous": {"limit": 5}}')
+    monkeypatch.setenv('RATE_LIMIT_ROLE_TIERS', '{"admin": "premium"}')
+
+    assert RateLimitSettings().tier_limits('premium') == (1000, 60)
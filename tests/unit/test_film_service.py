@@ -0,0 +1,68 @@
+import pytest
+
+from db.cache import Cache, RedisCacheStorage
+from models.film import Film, MainFilmInformation
+from models.utils import ResultIds
+from services.film import FilmServiceID, FilmServiceSort
+from services.result_window import ResultWindow
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeFilmStorage:
+    def __init__(self):
+        self.requests = []
+
+    async def get_many(self, object_ids, model_class=Film):
+        self.requests.append((object_ids, model_class))
+        return [model_class(id=film_id, title=film_id, imdb_rating=7.0, genres_list=[], description=None,
+                            actors=[], writers=[], directors=[])
+                for film_id in object_ids]
+
+
+async def test_listing_hydration_fetches_only_main_fields_of_missing_films(sharded_redis):
+    storage = FakeFilmStorage()
+    cache = Cache(Film, RedisCacheStorage(sharded_redis, cache_time=60), namespace='FilmHydration')
+    await cache.set(Film(id='f2', title='cached', imdb_rating=9.0, genres_list=[], description='d',
+                         actors=[], writers=[], directors=[]), uuid='f2')
+    main_cache = Cache(MainFilmInformation, RedisCacheStorage(sharded_redis, cache_time=60),
+                       namespace='FilmMainHydration')
+    service = FilmServiceID(cache, storage, main_cache)
+
+    films = await service.get_main_info(['f1', 'f2', 'f3'])
+
+    assert [(film.id, film.title) for film in films] == [('f1', 'f1'), ('f2', 'cached'), ('f3', 'f3')]
+    assert all(isinstance(film, MainFilmInformation) for film in films)
+    assert storage.requests == [(['f1', 'f3'], MainFilmInformation)]
+    assert await cache.get(uuid='f1') is None
+    assert (await main_cache.get(uuid='f1')).title == 'f1'
+
+
+class FakeSortStorage:
+    def __init__(self, ids):
+        self.ids = ids
+        self.requests = 0
+
+    async def get_ids(self, genre, sort, size):
+        self.requests += 1
+        return ResultIds(ids=self.ids[:size])
+
+
+async def test_repeated_listing_makes_no_storage_calls(sharded_redis):
+    film_storage = FakeFilmStorage()
+    sort_storage = FakeSortStorage(['f%s' % number for number in range(20)])
+    film_service = FilmServiceID(Cache(Film, RedisCacheStorage(sharded_redis, cache_time=60), namespace='FilmList'),
+                                 film_storage,
+                                 Cache(MainFilmInformation, RedisCacheStorage(sharded_redis, cache_time=60),
+                                       namespace='FilmMainList'))
+    window = ResultWindow(Cache(ResultIds, RedisCacheStorage(sharded_redis, cache_time=60), namespace='FilmWindow'),
+                          film_service.get_main_info, 10)
+    service = FilmServiceSort(None, sort_storage, window)
+
+    first = await service.get_data(1, 5, None, '-imdb_rating')
+    requests = (sort_storage.requests, len(film_storage.requests))
+    for _ in range(2):
+        assert await service.get_data(1, 5, None, '-imdb_rating') == first
+
+    assert [film.id for film in first] == ['f0', 'f1', 'f2', 'f3', 'f4']
+    assert (sort_storage.requests, len(film_storage.requests)) == requests == (1, 1)
@@ -0,0 +1,110 @@
+from http import HTTPStatus
+
+import fakeredis
+import httpx
+import pytest
+from fakeredis import aioredis
+from fastapi import FastAPI
+
+import limiter
+from core.config import settings
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def limited_client(monkeypatch, calls):
+    monkeypatch.setattr(limiter, 'redis', aioredis.FakeRedis(server=fakeredis.FakeServer()))
+    monkeypatch.setattr(limiter, 'gcra', limiter.redis.register_script(limiter.GCRA_SCRIPT))
+    monkeypatch.setattr(limiter, 'batching', True)
+    monkeypatch.setattr(limiter, 'local_limiter', None)
+    monkeypatch.setattr(settings.rate_limit, 'limit', 2)
+    monkeypatch.setattr(settings.rate_limit, 'interval', 60)
+    monkeypatch.setattr(settings.rate_limit, 'tiers', {})
+    monkeypatch.setattr(settings.rate_limit, 'route_costs', {'/search': 2, '/free': 0})
+    monkeypatch.setattr(settings.rate_limit, 'batched_routes', {'/cached'})
+
+    app = FastAPI()
+    app.middleware('http')(limiter.rate_limit_middleware)
+
+    @app.get('/cached')
+    async def cached():
+        calls.append('cached')
+        return {}
+
+    @app.post('/admin')
+    async def admin():
+        calls.append('admin')
+        return {}
+
+    @app.get('/search')
+    async def search():
+        calls.append('search')
+        return {}
+
+    @app.get('/free')
+    async def free():
+        return {}
+
+    return httpx.AsyncClient(app=app, base_url='http://test')
+
+
+async def test_unbatched_route_is_rejected_before_handler(limited_client, calls):
+    statuses = [(await limited_client.post('/admin')).status_code for _ in range(3)]
+
+    assert statuses == [HTTPStatus.OK, HTTPStatus.OK, HTTPStatus.TOO_MANY_REQUESTS]
+    assert calls == ['admin', 'admin']
+
+
+async def test_batched_route_without_cache_read_is_checked_after_handler(limited_client, calls):
+    statuses = [(await limited_client.get('/cached')).status_code for _ in range(3)]
+
+    assert statuses == [HTTPStatus.OK, HTTPStatus.OK, HTTPStatus.TOO_MANY_REQUESTS]
+    assert len(calls) == 3
+
+
+async def test_gcra_allows_burst_up_to_limit(limited_client):
+    results = [await limiter.hit('rate_limit:ip:burst', 3, 60) for _ in range(4)]
+
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert [state.remaining for _, state in results] == [2, 1, 0, 0]
+    # Следующая единица квоты освобождается через interval / limit
+    assert 19 < results[-1][1].retry_after <= 20
+    assert 59 < results[-1][1].reset <= 60
+
+
+async def test_gcra_charges_route_cost(limited_client):
+    assert (await limiter.hit('rate_limit:ip:cost', 3, 60, cost=2))[0]
+    assert not (await limiter.hit('rate_limit:ip:cost', 3, 60, cost=2))[0]
+    # Отклонённый запрос квоту не расходует
+    allowed, state = await limiter.hit('rate_limit:ip:cost', 3, 60, cost=1)
+    assert allowed
+    assert state.remaining == 0
+
+
+async def test_rate_limit_headers_and_retry_after(limited_client, calls):
+    allowed = await limited_client.post('/admin')
+    rejected = [await limited_client.post('/admin') for _ in range(2)][-1]
+
+    assert allowed.headers['RateLimit-Limit'] == '2'
+    assert allowed.headers['RateLimit-Remaining'] == '1'
+    assert allowed.headers['RateLimit-Reset'] == '30'
+    assert 'Retry-After' not in allowed.headers
+    assert rejected.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert rejected.json() == {'detail': 'Too many requests'}
+    assert rejected.headers['Retry-After'] == '30'
+    assert rejected.headers['RateLimit-Remaining'] == '0'
+
+
+async def test_expensive_route_uses_up_quota_faster(limited_client, calls):
+    statuses = [(await limited_client.get('/search')).status_code for _ in range(2)]
+    free = [(await limited_client.get('/free')).status_code for _ in range(3)]
+
+    assert statuses == [HTTPStatus.OK, HTTPStatus.TOO_MANY_REQUESTS]
+    assert calls == ['search']
+    assert free == [HTTPStatus.OK] * 3
@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from fakeredis import aioredis
+from redis.asyncio.client import Pipeline
+
+import limiter
+from limiter import LocalLimiter
+
+pytestmark = pytest.mark.asyncio
+
+KEY = 'rate_limit:ip:hybrid'
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def clock(monkeypatch, server):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(limiter, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(limiter, 'redis', aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(limiter, 'gcra', limiter.redis.register_script(limiter.GCRA_SCRIPT))
+    return clock
+
+
+async def test_local_bucket_refills_over_time(clock):
+    local = LocalLimiter(sync_interval=1, penalty_time=10)
+
+    results = [local.hit(KEY, 4, 60) for _ in range(5)]
+    assert [allowed for allowed, _ in results] == [True, True, True, True, False]
+    assert results[-1][1].retry_after == 15
+
+    clock.now += 15
+    assert local.hit(KEY, 4, 60)[0]
+    assert not local.hit(KEY, 4, 60)[0]
+
+
+async def test_workers_sharing_redis_end_up_in_penalty_box(clock):
+    first, second = LocalLimiter(sync_interval=1, penalty_time=10), LocalLimiter(sync_interval=1, penalty_time=10)
+    for worker in (first, second):
+        assert all(worker.hit(KEY, 4, 60, cost=1)[0] for _ in range(3))
+
+    await first.sync()
+    # Общий остаток меньше локального: у воркера остаётся один токен
+    allowed, state = first.hit(KEY, 4, 60)
+    assert allowed and state.remaining == 0
+    await second.sync()
+    await first.sync()
+
+    for worker in (first, second):
+        allowed, state = worker.hit(KEY, 4, 60)
+        assert not allowed
+        assert state.retry_after >= 10
+
+
+async def test_penalty_expires(clock):
+    first, second = LocalLimiter(sync_interval=1, penalty_time=10), LocalLimiter(sync_interval=1, penalty_time=10)
+    assert first.hit(KEY, 2, 60, cost=2)[0]
+    assert second.hit(KEY, 2, 60, cost=2)[0]
+    await first.sync()
+    await second.sync()
+
+    allowed, state = second.hit(KEY, 2, 60)
+    assert not allowed and 50 < state.retry_after <= 60
+    clock.now += 61
+    assert second.hit(KEY, 2, 60)[0]
+
+
+async def test_failed_sync_keeps_pending_tokens(clock, server):
+    local = LocalLimiter(sync_interval=1, penalty_time=10)
+    local.hit(KEY, 4, 60, cost=3)
+    server.connected = False
+
+    await local.sync()
+
+    server.connected = True
+    await local.sync()
+    assert (await limiter.hit(KEY, 4, 60))[1].remaining == 0
+
+
+async def test_close_during_sync_keeps_batch(clock, monkeypatch):
+    execute = Pipeline.execute
+    blocked = asyncio.Event()
+
+    async def hanging_execute(pipe, *args, **kwargs):
+        if not blocked.is_set():
+            blocked.set()
+            await asyncio.Event().wait()
+        return await execute(pipe, *args, **kwargs)
+
+    monkeypatch.setattr(Pipeline, 'execute', hanging_execute)
+    local = LocalLimiter(sync_interval=0, penalty_time=10)
+    local.hit(KEY, 4, 60, cost=3)
+    local.start()
+    await blocked.wait()
+
+    await local.close()
+
+    assert (await limiter.hit(KEY, 4, 60))[1].remaining == 0
@@ -0,0 +1,138 @@
+from http import HTTPStatus
+
+import httpx
+import pytest
+from elasticsearch import RequestError
+from fastapi import Depends, FastAPI, HTTPException
+from starlette.requests import Request
+
+from api.v1 import messages
+from api.v1.pagination import check_page_number, encode_cursor, get_cursor, invalid_cursor_handler
+from core.config import settings
+from db.base_film import BaseElasticFilmSort
+from models.utils import Cursor, InvalidCursorError
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_exception_handler(InvalidCursorError, invalid_cursor_handler)
+
+    async def page(request: Request, cursor: Cursor | None):
+        if cursor is not None and cursor.after == ['rejected']:
+            raise InvalidCursorError('Invalid cursor')
+        return {'next_cursor': encode_cursor(request, Cursor(after=[8.5, 'f1']))}
+
+    @app.get('/films')
+    async def films(request: Request, sort: str = '-imdb_rating', cursor: Cursor | None = Depends(get_cursor)):
+        return await page(request, cursor)
+
+    @app.get('/genres')
+    async def genres(request: Request, sort: str = 'name', cursor: Cursor | None = Depends(get_cursor)):
+        return await page(request, cursor)
+
+    return httpx.AsyncClient(app=app, base_url='http://test')
+
+
+async def _next_cursor(client, url, params):
+    response = await client.get(url, params=params)
+    assert response.status_code == HTTPStatus.OK
+    return response.json()['next_cursor']
+
+
+async def test_cursor_round_trip_with_other_page_size(client):
+    cursor = await _next_cursor(client, '/films', {'sort': 'imdb_rating', 'page_size': 5})
+
+    response = await client.get('/films', params={'sort': 'imdb_rating', 'page_size': 10, 'cursor': cursor})
+
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.parametrize('url, params', [
+    ('/films', {'sort': '-imdb_rating'}),
+    ('/genres', {'sort': 'imdb_rating'}),
+])
+async def test_cursor_from_other_query_is_rejected(client, url, params):
+    cursor = await _next_cursor(client, '/films', {'sort': 'imdb_rating'})
+
+    response = await client.get(url, params=dict(params, cursor=cursor))
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': messages.INVALID_CURSOR}
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    Cursor.model_construct(after=[], offset=0, scope='').encode(),
+    Cursor(offset=settings.elasticsearch.max_result_window).encode(),
+])
+async def test_malformed_or_too_deep_cursor_is_rejected(client, cursor):
+    response = await client.get('/films', params={'cursor': cursor})
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+async def test_storage_rejection_maps_to_invalid_cursor(client):
+    scope = Cursor.decode(await _next_cursor(client, '/films', {})).scope
+    cursor = Cursor(after=['rejected'], scope=scope).encode()
+
+    response = await client.get('/films', params={'cursor': cursor})
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': messages.INVALID_CURSOR}
+
+
+async def test_search_after_rejected_by_elasticsearch_raises_invalid_cursor():
+    class Elastic:
+        async def search(self, **kwargs):
+            raise RequestError(400, 'search_phase_execution_exception', {})
+
+    with pytest.raises(InvalidCursorError):
+        await BaseElasticFilmSort(Elastic()).get_page(10, None, '-imdb_rating', Cursor(after=['x']))
+
+
+async def test_offset_page_is_clamped_to_result_window():
+    bodies = []
+
+    class Elastic:
+        async def search(self, body, **kwargs):
+            bodies.append(body)
+            return {}
+
+    offset = settings.elasticsearch.max_result_window - 3
+    assert await BaseElasticFilmSort(Elastic()).get_page(10, None, '-imdb_rating', Cursor(offset=offset)) == ([], None)
+    assert bodies[0]['from'] == offset and bodies[0]['size'] == 3
+
+
+async def test_full_page_at_result_window_continues_with_search_after(monkeypatch):
+    monkeypatch.setattr(settings.elasticsearch, 'max_result_window', 12)
+
+    class Elastic:
+        async def search(self, body, **kwargs):
+            return {'hits': {'hits': [
+                {'_source': {'id': 'f%s' % number, 'title': 't', 'imdb_rating': 7.0, 'genres_list': []},
+                 'sort': [7.0, 'f%s' % number]}
+                for number in range(body['from'], body['from'] + body['size'])
+            ]}}
+
+    films, cursor = await BaseElasticFilmSort(Elastic()).get_page(5, None, '-imdb_rating', Cursor(offset=10))
+
+    assert [film.id for film in films] == ['f10', 'f11']
+    assert cursor == Cursor(after=[7.0, 'f11'])
+
+
+async def test_page_number_past_result_window(monkeypatch):
+    monkeypatch.setattr(settings.elasticsearch, 'max_result_window', 12)
+
+    class Elastic:
+        async def search(self, **kwargs):
+            raise AssertionError('from is past max_result_window')
+
+    assert await BaseElasticFilmSort(Elastic()).get_list(4, 5, None, '-imdb_rating') == []
+    check_page_number(2, 5)
+    with pytest.raises(HTTPException) as exc:
+        check_page_number(3, 4)
+    assert exc.value.status_code == HTTPStatus.BAD_REQUEST
+    assert exc.value.detail == messages.PAGE_OUT_OF_WINDOW
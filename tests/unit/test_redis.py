@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from fakeredis import aioredis
+
+from db import redis as sharded
+from db.redis import ShardedRedis
+
+pytestmark = pytest.mark.asyncio
+
+KEYS = ['Film:%s' % number for number in range(300)]
+
+
+async def test_ring_spreads_keys_over_all_nodes(sharded_redis):
+    groups = sharded_redis.group(KEYS)
+
+    assert set(groups) == set(sharded_redis.nodes)
+    assert all(len(keys) > len(KEYS) / 10 for keys in groups.values())
+    # Раскладка зависит только от имён узлов: все воркеры находят ключ на одном узле
+    other = ShardedRedis({name: None for name in reversed(list(sharded_redis.nodes))})
+    assert [other.node_name(key) for key in KEYS] == [sharded_redis.node_name(key) for key in KEYS]
+
+
+async def test_removed_node_moves_only_its_keys(redis_servers, sharded_redis):
+    del redis_servers['redis-3:6379']
+    smaller = ShardedRedis({name: aioredis.FakeRedis(server=server) for name, server in redis_servers.items()})
+
+    for key in KEYS:
+        if sharded_redis.node_name(key) != 'redis-3:6379':
+            assert smaller.node_name(key) == sharded_redis.node_name(key)
+
+
+async def test_down_node_is_skipped_until_retry(redis_servers, monkeypatch):
+    redis = ShardedRedis({name: aioredis.FakeRedis(server=server) for name, server in redis_servers.items()},
+                         retry_interval=5)
+    now = time.monotonic()
+    monkeypatch.setattr(sharded.time, 'monotonic', lambda: now)
+    redis_servers['redis-2:6379'].connected = False
+    calls = []
+
+    async def ping(node):
+        calls.append(node)
+        return await node.ping()
+
+    assert await redis.call_node('redis-2:6379', ping, default='miss') == 'miss'
+    assert not redis.is_up('redis-2:6379')
+    assert redis.node(next(key for key in KEYS if redis.node_name(key) == 'redis-2:6379')) is None
+    assert await redis.call_node('redis-2:6379', ping, default='miss') == 'miss'
+    assert len(calls) == 1
+    assert await redis.call_node('redis-1:6379', ping) is True
+
+    redis_servers['redis-2:6379'].connected = True
+    monkeypatch.setattr(sharded.time, 'monotonic', lambda: now + 5)
+    assert await redis.call_node('redis-2:6379', ping) is True
+    assert len(calls) == 3
+
+
+async def test_pipeline_sends_each_key_to_its_node(redis_servers, sharded_redis):
+    pipe = sharded_redis.pipeline()
+    for key in KEYS:
+        pipe.for_key(key).set(key, 1)
+
+    assert await pipe.execute()
+
+    for name, keys in sharded_redis.group(KEYS).items():
+        stored = await aioredis.FakeRedis(server=redis_servers[name]).keys('*')
+        assert sorted(stored) == sorted(key.encode() for key in keys)
+
+
+async def test_pipeline_skips_down_node_and_reports_failed_write(redis_servers, sharded_redis):
+    down = 'redis-2:6379'
+    redis_servers[down].connected = False
+    pipe = sharded_redis.pipeline()
+    for key in KEYS:
+        pipe.for_key(key).set(key, 1)
+
+    assert await pipe.execute() is False
+    assert not sharded_redis.is_up(down)
+
+    pipe = sharded_redis.pipeline()
+    queued = [key for key in KEYS if pipe.for_key(key) is not None]
+    assert queued == [key for key in KEYS if sharded_redis.node_name(key) != down]
+    for key in queued:
+        pipe.for_key(key).set(key, 2)
+    assert await pipe.execute()
@@ -0,0 +1,75 @@
+import asyncio
+from functools import partial
+
+import pytest
+
+import limiter
+from db import request_batch
+from db.cache import Cache, RedisCacheStorage
+from db.request_batch import RequestBatch
+from limiter import RateLimitExceeded
+from models.genre import Genre
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _get_or_load(cache, loader, principal, limit=1):
+    batch = RequestBatch()
+    batch.defer(limiter.redis, partial(limiter._queue_gcra, principal, limit, 60, 1), partial(limiter._check, limit))
+    request_batch.current_batch.set(batch)
+    return await cache.get_or_load(loader, uuid='g1')
+
+
+@pytest.mark.parametrize('abuser_first', [True, False])
+async def test_rate_limited_caller_does_not_fail_coalesced_load(sharded_redis, monkeypatch, abuser_first):
+    namespace = 'BatchGenre%s' % abuser_first
+    cache = Cache(Genre, RedisCacheStorage(sharded_redis, cache_time=60), namespace=namespace)
+    key_node = sharded_redis.node_name(cache._key(uuid='g1'))
+    # Лимиты на другом узле: счётчик не попадает в пайплайн чтения и проверяется перед загрузкой
+    monkeypatch.setattr(limiter, 'redis', next(node for name, node in sharded_redis.nodes.items() if name != key_node))
+    monkeypatch.setattr(limiter, 'gcra', limiter.redis.register_script(limiter.GCRA_SCRIPT))
+    allowed, _ = await limiter.hit('rate_limit:abuser', 1, 60)
+    assert allowed
+
+    started, release = asyncio.Event(), asyncio.Event()
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        started.set()
+        await release.wait()
+        return Genre(id='g1', name='Action')
+
+    if abuser_first:
+        abuser = asyncio.create_task(_get_or_load(cache, loader, 'rate_limit:abuser'))
+        user = asyncio.create_task(_get_or_load(cache, loader, 'rate_limit:user'))
+    else:
+        user = asyncio.create_task(_get_or_load(cache, loader, 'rate_limit:user'))
+        await started.wait()
+        abuser = asyncio.create_task(_get_or_load(cache, loader, 'rate_limit:abuser'))
+    await asyncio.sleep(0.05)
+    release.set()
+
+    assert await user == Genre(id='g1', name='Action')
+    with pytest.raises(RateLimitExceeded):
+        await abuser
+    assert loads == 1
+
+
+async def test_counter_is_sent_with_cache_read_on_same_node(sharded_redis, monkeypatch):
+    cache = Cache(Genre, RedisCacheStorage(sharded_redis, cache_time=60), namespace='BatchGenreSameNode')
+    await cache.set(Genre(id='g1', name='Action'), uuid='g1')
+    node = sharded_redis.nodes[sharded_redis.node_name(cache._key(uuid='g1'))]
+    monkeypatch.setattr(limiter, 'redis', node)
+    monkeypatch.setattr(limiter, 'gcra', node.register_script(limiter.GCRA_SCRIPT))
+    await node.script_load(limiter.GCRA_SCRIPT)
+
+    batch = RequestBatch()
+    result = batch.defer(node, partial(limiter._queue_gcra, 'rate_limit:user', 5, 60, 1), partial(limiter._check, 5))
+    request_batch.current_batch.set(batch)
+    assert await cache._storage.get_with_ttl(cache._key(uuid='g1')) != (None, -2)
+
+    assert result.done()
+    allowed, state = limiter._state(5, result.result())
+    assert allowed and state.remaining == 4
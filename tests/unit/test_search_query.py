@@ -0,0 +1,13 @@
+import pytest
+
+from services.cache import normalize_query
+
+
+@pytest.mark.parametrize('text', ['Star Wars', 'star wars ', 'STAR  WARS', '\tStar\nwars'])
+def test_case_and_spaces_share_one_key(text):
+    assert normalize_query(text) == 'star wars'
+
+
+@pytest.mark.parametrize('text', ['Straße', 'ＳＴＡＲ'])
+def test_text_sent_to_elasticsearch_keeps_its_letters(text):
+    assert normalize_query(text) == text.lower()
@@ -0,0 +1,32 @@
+import os
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from db.shared_cache import SharedCache
+
+
+@pytest.fixture
+def segment():
+    name = 'test_%s' % os.getpid()
+    cache = SharedCache.open(name, 16, 256, ttl=5)
+    yield cache
+    cache.close()
+    SharedMemory(name='%s_16x256' % name).unlink()
+
+
+def test_entry_lives_no_longer_than_shared_ttl(segment):
+    segment.set('film', b'data', 600)
+
+    raw, ttl = segment.get('film')
+
+    assert raw == b'data'
+    assert ttl <= 5
+
+
+def test_shorter_ttl_is_kept(segment, monkeypatch):
+    segment.set('film', b'data', 1)
+    monkeypatch.setattr(time, 'time', lambda now=time.time(): now + 2)
+
+    assert segment.get('film') == (None, 0)
@@ -0,0 +1,43 @@
+import time
+from weakref import WeakSet
+
+import pytest
+
+from db import snapshot
+from db.cache import LocalCache, save_local_caches
+from db.codec import MISSING, CacheCodec
+from db.snapshot import CacheSnapshot
+from models.genre import Genre
+
+GENRE = Genre(id='g1', name='Action')
+GENRES = [GENRE, Genre(id='g2', name='Drama')]
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    monkeypatch.setattr(LocalCache, 'instances', WeakSet())
+    monkeypatch.setattr(snapshot, 'snapshot', None)
+    local = LocalCache(10, 60, CacheCodec(Genre))
+    local.set('Genre:g1', GENRE)
+    local.set('Genre:missing', MISSING)
+    local.set('GenreAll:1', GENRES)
+    local.set('Genre:expired', GENRE, ttl=0.05)
+    path = str(tmp_path / 'local_cache.snapshot')
+    save_local_caches(path, 'generation-1')
+    return path
+
+
+def test_snapshot_restores_local_cache_after_restart(path, monkeypatch):
+    time.sleep(0.1)
+    monkeypatch.setattr(snapshot, 'snapshot', CacheSnapshot.load(path, 'generation-1'))
+    local = LocalCache(10, 60, CacheCodec(Genre))
+
+    assert local.get('Genre:g1') == GENRE
+    assert local.get('Genre:missing') is MISSING
+    assert local.get('GenreAll:1') == GENRES
+    assert local.get('Genre:expired') is None
+    snapshot.snapshot.close()
+
+
+def test_snapshot_of_other_generation_is_ignored(path):
+    assert CacheSnapshot.load(path, 'generation-2') is None